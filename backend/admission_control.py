@@ -0,0 +1,179 @@
+"""
+Admission control for emotion detection
+Sheds frames once too many are already waiting for inference, so a burst of
+emotion traffic degrades to stale results instead of slowing every request
+(and the chat endpoints sharing the server) down until they time out, and
+drops frames that a newer frame of the same session has superseded
+"""
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class AdmissionController:
+    """
+    Counts frames in flight and keeps each session's latest result
+    admit() refuses new frames while max_backlog frames are in flight;
+    callers answer those with last_result() marked stale
+    """
+
+    def __init__(self, max_backlog=None, retry_after_ms=None, max_sessions=1024):
+        """
+        Args:
+            max_backlog: Frames allowed in flight at once, 0 to disable.
+                Defaults to ADMISSION_MAX_BACKLOG, then 32.
+            retry_after_ms: Retry hint given with shed frames. Defaults to
+                ADMISSION_RETRY_MS, then 2000.
+            max_sessions: Sessions to keep the latest result for (LRU)
+        """
+        self.max_backlog = max_backlog if max_backlog is not None else int(os.getenv('ADMISSION_MAX_BACKLOG', '32'))
+        self.retry_after_ms = retry_after_ms or int(os.getenv('ADMISSION_RETRY_MS', '2000'))
+        self.max_sessions = max_sessions
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def admit(self):
+        """Reserve a slot for one frame; returns False if the frame should be shed"""
+        with self.lock:
+            if self.max_backlog and self.in_flight >= self.max_backlog:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True
+
+    def release(self):
+        """Free the slot of an admitted frame"""
+        with self.lock:
+            self.in_flight -= 1
+
+    def remember(self, session_id, result):
+        """Record a session's latest detection result"""
+        with self.lock:
+            self.results[session_id] = result
+            self.results.move_to_end(session_id)
+            if len(self.results) > self.max_sessions:
+                self.results.popitem(last=False)
+
+    def last_result(self, session_id):
+        """Get a session's latest detection result, if any"""
+        if session_id is None:
+            return None
+        with self.lock:
+            return self.results.get(session_id)
+
+    def discard(self, session_id):
+        """Forget a session's latest result"""
+        with self.lock:
+            self.results.pop(session_id, None)
+
+    def stats(self):
+        """Get in-flight and shedding counters"""
+        with self.lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'max_backlog': self.max_backlog,
+                'admitted': self.admitted,
+                'shed': self.shed
+            }
+
+
+class FrameSequencer:
+    """
+    Drops frames nobody will read the result of
+    A frame is superseded once a frame with a higher sequence number from the
+    same session has arrived, and expired once it is older than max_age_ms.
+    Ages are measured against the session's fastest-arriving frame, so the
+    client's clock does not have to agree with the server's.
+    """
+
+    def __init__(self, max_age_ms=None, max_sessions=1024):
+        """
+        Args:
+            max_age_ms: Oldest frame worth processing, 0 to disable. Defaults
+                to FRAME_MAX_AGE_MS, then 3000.
+            max_sessions: Sessions to keep state for (LRU)
+        """
+        self.max_age_ms = max_age_ms if max_age_ms is not None else float(os.getenv('FRAME_MAX_AGE_MS', '3000'))
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.dropped = Counter()
+
+    def arrive(self, session_id, sequence=None, captured_at=None):
+        """
+        Record a frame's arrival
+        Returns None if the frame should be processed, else the reason to
+        drop it: 'superseded' or 'expired'
+        """
+        if session_id is None or (sequence is None and captured_at is None):
+            return None
+
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = {'sequence': None, 'offset_ms': None}
+                self.sessions[session_id] = state
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session_id)
+
+            if sequence is not None and (state['sequence'] is None or sequence > state['sequence']):
+                state['sequence'] = sequence
+            if captured_at is not None:
+                # Smallest server-minus-client time seen: clock skew plus the fastest transit
+                offset = time.time() * 1000 - captured_at
+                if state['offset_ms'] is None or offset < state['offset_ms']:
+                    state['offset_ms'] = offset
+
+        return self.check(session_id, sequence, captured_at)
+
+    def check(self, session_id, sequence=None, captured_at=None):
+        """
+        Check whether an arrived frame is still worth processing
+        Called again right before inference; returns None or the drop reason
+        """
+        if session_id is None:
+            return None
+
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                return None
+
+            reason = None
+            if sequence is not None and state['sequence'] is not None and sequence < state['sequence']:
+                reason = 'superseded'
+            elif captured_at is not None and self.max_age_ms:
+                age = time.time() * 1000 - captured_at - state['offset_ms']
+                if age > self.max_age_ms:
+                    reason = 'expired'
+
+            if reason:
+                self.dropped[reason] += 1
+            return reason
+
+    def discard(self, session_id):
+        """Forget a session's state"""
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def stats(self):
+        """Get drop counters"""
+        with self.lock:
+            return {
+                'max_age_ms': self.max_age_ms,
+                'sessions': len(self.sessions),
+                'dropped': dict(self.dropped)
+            }
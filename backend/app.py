@@ -3,17 +3,27 @@ Flask Backend for AI-based Mental Health Monitoring and Support System
 Main application file with API endpoints
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import os
 import json
+import math
+import multiprocessing
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import base64
-import cv2
-import numpy as np
 
-from emotion_detector import EmotionDetector
+from emotion_detector import EmotionDetector, analyze_video, decode_frame, decode_reduction, scale_face_locations
+from inference_pool import InferencePool
+from batch_scheduler import MicroBatchScheduler
+from stage_pipeline import FrameSkipped, StagePipeline
+from admission_control import AdmissionController, FrameSequencer
+from emotion_smoothing import EmotionSmoother
+from model_loader import BackgroundLoader, memory_usage, preload
 from chatbot import TherapeuticChatbot
 from database import Database
 
@@ -27,14 +37,91 @@ else:
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Configuration
+UPLOAD_FOLDER = 'uploads'
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+MAX_BATCH_FRAMES = int(os.getenv('MAX_BATCH_FRAMES', '64'))
+STREAM_NAMESPACE = '/emotion'
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '0'))
+MICRO_BATCHING = os.getenv('MICRO_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', 'false').lower() in ('1', 'true', 'yes')
+VIDEO_ANALYSIS_WORKERS = int(os.getenv('VIDEO_ANALYSIS_WORKERS', '1'))
+VIDEO_JOBS_KEEP = int(os.getenv('VIDEO_JOBS_KEEP', '100'))
+STAGE_PIPELINE = os.getenv('STAGE_PIPELINE', 'false').lower() in ('1', 'true', 'yes')
+
+
+def build_emotion_detector():
+    """Build and warm up the emotion detection stack"""
+    # With INFERENCE_WORKERS > 0 detection runs in worker processes
+    if INFERENCE_WORKERS > 0:
+        detector = InferencePool(num_workers=INFERENCE_WORKERS)
+        detector.start()
+    else:
+        detector = EmotionDetector()
+        if PRELOAD_MODELS:
+            # Built in the master, used in forked workers; warm_up_worker() runs
+            # the warm-up in each worker so runtime threads start after fork
+            if not detector.fork_safe:
+                raise ValueError(
+                    f"PRELOAD_MODELS cannot be used with the {detector.classifier.name} emotion "
+                    "classifier, its runtime is not fork-safe; use EMOTION_CLASSIFIER=onnx "
+                    "or PRELOAD_MODELS=false"
+                )
+        else:
+            detector.warm_up()
+    # Decode, face detection and classification run on separate thread pools
+    if STAGE_PIPELINE:
+        if INFERENCE_WORKERS > 0 or MICRO_BATCHING:
+            raise ValueError('STAGE_PIPELINE cannot be combined with INFERENCE_WORKERS or MICRO_BATCHING')
+        detector = StagePipeline(detector)
+    # Concurrent single-frame requests are grouped into batches
+    if MICRO_BATCHING:
+        detector = MicroBatchScheduler(detector)
+    return detector
+
+
 # Initialize components
-emotion_detector = EmotionDetector()
+# The emotion detector loads in the background; chat and session endpoints
+# are served immediately and emotion endpoints report 'warming' until ready
+emotion_loader = BackgroundLoader('Emotion detector', build_emotion_detector)
+emotion_smoother = EmotionSmoother()
+# Sheds emotion frames once too many are waiting for inference
+emotion_admission = AdmissionController()
+# Drops frames superseded by a newer frame of the same session, or too old to matter
+frame_sequencer = FrameSequencer()
 chatbot = TherapeuticChatbot()
 db = Database()
 
-# Configuration
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Uploaded session videos are analyzed in the background, VIDEO_ANALYSIS_WORKERS at a time
+video_executor = ThreadPoolExecutor(max_workers=VIDEO_ANALYSIS_WORKERS)
+# Job state by id, in the order jobs were submitted or finished; only the
+# VIDEO_JOBS_KEEP most recently finished jobs (and their timelines) are kept
+video_jobs = OrderedDict()
+video_jobs_lock = threading.Lock()
+
+# Spawned inference workers re-import this module; only the server process loads models
+# (parent_process() is not yet set while a spawned child imports its main module)
+if multiprocessing.current_process().name == 'MainProcess':
+    if PRELOAD_MODELS:
+        # Pre-fork servers (gunicorn --preload): load synchronously so forked
+        # workers share the model copy-on-write
+        if INFERENCE_WORKERS > 0:
+            raise ValueError('PRELOAD_MODELS cannot be combined with INFERENCE_WORKERS')
+        preload(emotion_loader)
+    else:
+        emotion_loader.start()
+
+
+def warm_up_worker():
+    """
+    Warm up a preloaded detector in a forked worker (gunicorn post_fork)
+    Inference before fork would start the classifier runtime's threads in the master
+    """
+    detector = emotion_loader.instance
+    # Unwrap StagePipeline / MicroBatchScheduler
+    while not isinstance(detector, EmotionDetector):
+        detector = detector.detector
+    detector.warm_up()
 
 
 @app.route('/')
@@ -47,19 +134,55 @@ def serve():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """
+    Health check endpoint
+    The server is healthy as soon as it can serve chat and sessions;
+    'ready' additionally requires the emotion detector to be loaded
+    """
     return jsonify({
         'status': 'healthy',
+        'ready': emotion_loader.ready,
+        'components': {
+            'chatbot': 'ready',
+            'database': 'ready',
+            'emotion_detector': emotion_loader.status()
+        },
+        'process': {
+            'pid': os.getpid(),
+            'memory': memory_usage()
+        },
         'timestamp': datetime.now().isoformat()
     })
 
 
+def emotion_unavailable():
+    """
+    503 response for emotion requests while the detector is not loaded
+    Only a detector that is still warming up is worth retrying; a failed
+    load is permanent, so that response carries no Retry-After
+    """
+    if emotion_loader.state == 'failed':
+        response = jsonify({
+            'success': False,
+            'status': 'failed',
+            'error': f'Emotion detection unavailable: {emotion_loader.error}'
+        })
+        return response, 503
+    
+    response = jsonify({'success': False, 'status': emotion_loader.state, 'error': 'Emotion detection is warming up'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 @app.route('/api/emotion/detect', methods=['POST'])
 def detect_emotion():
     """
     Detect emotions from image data
     Expects base64 encoded image in request
     """
+    if not emotion_loader.ready:
+        return emotion_unavailable()
+    
     try:
         data = request.get_json()
         
@@ -67,25 +190,229 @@ def detect_emotion():
             return jsonify({'error': 'No image provided'}), 400
         
         # Decode base64 image
-        image_data = data['image'].split(',')[1] if ',' in data['image'] else data['image']
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        sequence, captured_at = frame_order(data)
+        response = detect_and_log(decode_base64(data['image']), data.get('session_id'), sequence, captured_at)
         
-        if image is None:
+        if response is None:
             return jsonify({'error': 'Invalid image data'}), 400
         
-        # Detect emotions
-        result = emotion_detector.detect_emotions(image)
+        return detection_response(response)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/emotion/detect_binary', methods=['POST'])
+def detect_emotion_binary():
+    """
+    Detect emotions from a binary image upload
+    Accepts a raw image body (e.g. Content-Type: image/jpeg) with the session
+    in the session_id query parameter or X-Session-Id header, or a multipart
+    form with an 'image' file and optional 'session_id' field. Optional
+    'sequence' and 'captured_at' query parameters (form fields for multipart)
+    let stale frames be dropped.
+    """
+    if not emotion_loader.ready:
+        return emotion_unavailable()
+    
+    try:
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('image')
+            if upload is None:
+                return jsonify({'error': 'No image provided'}), 400
+            image_bytes = upload.read()
+            session_id = request.form.get('session_id')
+            sequence, captured_at = frame_order(request.form)
+        else:
+            # Read the body once; no base64 or JSON decoding involved
+            image_bytes = request.get_data(cache=False)
+            session_id = request.args.get('session_id') or request.headers.get('X-Session-Id')
+            sequence, captured_at = frame_order(request.args)
+        
+        if not image_bytes:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        response = detect_and_log(image_bytes, session_id, sequence, captured_at)
+        
+        if response is None:
+            return jsonify({'error': 'Invalid image data'}), 400
+        
+        return detection_response(response)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def detect_and_log(frame, session_id, sequence=None, captured_at=None):
+    """
+    Decode a JPEG/PNG frame, detect emotions and log them to the session
+    The response also carries the smoothed emotional state and a
+    next_capture_ms hint for when the client should send its next frame.
+    Returns None if the frame cannot be decoded.
+    
+    Frames carrying the client's per-session sequence number and capture
+    time (ms since epoch) are dropped, with dropped: true, once a newer frame
+    of the session has arrived or they are older than FRAME_MAX_AGE_MS.
+    Under overload the frame is shed without being decoded: the session's
+    last result is returned with stale: true and a retry_after_ms hint.
+    """
+    reason = frame_sequencer.arrive(session_id, sequence, captured_at)
+    if reason:
+        return dropped_frame(reason)
+    
+    if not emotion_admission.admit():
+        return shed_frame(session_id)
+    
+    def skip():
+        return frame_sequencer.check(session_id, sequence, captured_at)
+    
+    try:
+        detector = emotion_loader.instance
+        if isinstance(detector, StagePipeline):
+            # Decoding runs on the pipeline's own decode stage
+            result = detector.detect_encoded(frame, session_id=session_id, skip=skip)
+        else:
+            # Decode straight from the request buffer (np.frombuffer does not copy)
+            image = decode_frame(frame)
+            if image is None:
+                return None
+            reason = skip()
+            if reason:
+                return dropped_frame(reason)
+            result = scale_face_locations(detector.detect_emotions(image, session_id=session_id), decode_reduction())
+    except FrameSkipped as e:
+        return dropped_frame(e.reason)
+    finally:
+        emotion_admission.release()
+    
+    if result is None:
+        return None
+    
+    response = {
+        'success': True,
+        'emotions': result,
+        'timestamp': datetime.now().isoformat(),
+        'next_capture_ms': emotion_smoother.default_interval_ms
+    }
+    
+    # Store emotion log and update smoothing if session_id provided
+    if session_id:
+        db.log_emotion(session_id, result)
+        emotion_admission.remember(session_id, result)
+        smoothing = emotion_smoother.update(session_id, result)
+        response['next_capture_ms'] = smoothing.pop('next_capture_ms')
+        response['smoothed'] = smoothing
+    
+    return response
+
+
+def shed_frame(session_id):
+    """
+    Response for a frame refused by admission control
+    Stale frames are not logged or smoothed; the client is asked to wait
+    retry_after_ms before its next capture
+    """
+    retry_after_ms = emotion_admission.retry_after_ms
+    last_result = emotion_admission.last_result(session_id)
+    if last_result is None:
+        return {
+            'success': False,
+            'stale': True,
+            'error': 'Emotion detection is overloaded',
+            'retry_after_ms': retry_after_ms
+        }
+    
+    return {
+        'success': True,
+        'stale': True,
+        'emotions': last_result,
+        'timestamp': datetime.now().isoformat(),
+        'next_capture_ms': retry_after_ms,
+        'retry_after_ms': retry_after_ms
+    }
+
+
+def dropped_frame(reason):
+    """Response for a frame dropped as superseded or expired"""
+    return {
+        'success': False,
+        'dropped': True,
+        'reason': reason
+    }
+
+
+def frame_order(source):
+    """Read a frame's sequence number and capture time (ms since epoch) from a mapping"""
+    sequence = source.get('sequence')
+    captured_at = source.get('captured_at')
+    return (
+        int(sequence) if sequence not in (None, '') else None,
+        float(captured_at) if captured_at not in (None, '') else None
+    )
+
+
+def detection_response(response):
+    """
+    JSON response for detect_and_log output
+    Shed frames carry a Retry-After header; without a result to fall back on
+    they are answered with 503. Dropped frames are answered with 409.
+    """
+    body = jsonify(response)
+    if 'retry_after_ms' in response:
+        body.headers['Retry-After'] = str(math.ceil(response['retry_after_ms'] / 1000))
+    if response.get('dropped'):
+        return body, 409
+    return body, 200 if response['success'] else 503
+
+
+@app.route('/api/emotion/detect_batch', methods=['POST'])
+def detect_emotion_batch():
+    """
+    Detect emotions from several frames in one classifier pass
+    Expects a list of frames, each a base64 encoded image or an
+    object with 'image' and an optional 'session_id'
+    """
+    if not emotion_loader.ready:
+        return emotion_unavailable()
+    
+    try:
+        data = request.get_json()
+        frames = data.get('frames') if data else None
+        
+        if not frames:
+            return jsonify({'error': 'No frames provided'}), 400
+        
+        if len(frames) > MAX_BATCH_FRAMES:
+            return jsonify({'error': f'Too many frames (max {MAX_BATCH_FRAMES})'}), 400
+        
+        images = []
+        session_ids = []
+        for index, frame in enumerate(frames):
+            if isinstance(frame, str):
+                frame = {'image': frame}
+            
+            if 'image' not in frame:
+                return jsonify({'error': f'No image provided for frame {index}'}), 400
+            
+            image = decode_image(frame['image'])
+            if image is None:
+                return jsonify({'error': f'Invalid image data for frame {index}'}), 400
+            
+            images.append(image)
+            session_ids.append(frame.get('session_id', data.get('session_id')))
         
-        # Store emotion log if session_id provided
-        session_id = data.get('session_id')
-        if session_id:
-            db.log_emotion(session_id, result)
+        # Detect emotions for all frames together
+        results = emotion_loader.instance.detect_emotions_batch(images, session_ids)
+        results = [scale_face_locations(result, decode_reduction()) for result in results]
+        
+        # Store emotion logs for frames tagged with a session
+        for session_id, result in zip(session_ids, results):
+            if session_id:
+                db.log_emotion(session_id, result)
         
         return jsonify({
             'success': True,
-            'emotions': result,
+            'results': results,
             'timestamp': datetime.now().isoformat()
         })
     
@@ -93,40 +420,265 @@ def detect_emotion():
         return jsonify({'error': str(e)}), 500
 
 
+def decode_base64(image_field):
+    """Decode a base64 (optionally data URL) image field into its encoded bytes"""
+    image_data = image_field.split(',')[1] if ',' in image_field else image_field
+    return base64.b64decode(image_data)
+
+
+def decode_image(image_field):
+    """Decode a base64 (optionally data URL) image into a BGR array"""
+    return decode_frame(decode_base64(image_field))
+
+
+@app.route('/api/emotion/stats', methods=['GET'])
+def get_emotion_stats():
+    """Get emotion detection runtime statistics (cache hit rate, tracked sessions)"""
+    if not emotion_loader.ready:
+        return emotion_unavailable()
+    
+    try:
+        stats = emotion_loader.instance.get_stats()
+        stats['admission'] = emotion_admission.stats()
+        stats['frame_order'] = frame_sequencer.stats()
+        return jsonify({
+            'success': True,
+            'stats': stats
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/emotion/analyze_video', methods=['POST'])
+def analyze_video_upload():
+    """
+    Analyze a recorded session video in the background
+    Expects a multipart 'video' file plus optional 'session_id', 'sample_fps'
+    and 'started_at' (ISO 8601) fields. Returns a job id to poll; the
+    per-second timeline is logged to the session as it is produced.
+    """
+    if not emotion_loader.ready:
+        return emotion_unavailable()
+    
+    try:
+        upload = request.files.get('video')
+        if upload is None or not upload.filename:
+            return jsonify({'error': 'No video provided'}), 400
+    
+        session_id = request.form.get('session_id') or db.create_session()
+        sample_fps = float(request.form['sample_fps']) if request.form.get('sample_fps') else None
+        started_at = datetime.fromisoformat(request.form['started_at']) if request.form.get('started_at') else None
+    
+        # cv2.VideoCapture reads from a path, so the upload is spooled to disk
+        job_id = str(uuid.uuid4())
+        path = os.path.join(UPLOAD_FOLDER, f"{job_id}{os.path.splitext(upload.filename)[1]}")
+        upload.save(path)
+    
+        with video_jobs_lock:
+            video_jobs[job_id] = {'status': 'queued', 'session_id': session_id, 'seconds_analyzed': 0}
+        video_executor.submit(run_video_job, job_id, path, session_id, sample_fps, started_at)
+    
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'session_id': session_id,
+            'status_url': f'/api/emotion/analyze_video/{job_id}'
+        }), 202
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/emotion/analyze_video/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    """Get the status of a video analysis job (and its timeline once done)"""
+    with video_jobs_lock:
+        job = video_jobs.get(job_id)
+        if job is not None:
+            job = dict(job, job_id=job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+
+def run_video_job(job_id, path, session_id, sample_fps, started_at):
+    """Run one video analysis job and record its outcome"""
+    job = video_jobs[job_id]
+    job['status'] = 'running'
+    
+    def progress(entry):
+        job['seconds_analyzed'] = entry['second'] + 1
+    
+    try:
+        job['timeline'] = analyze_video(
+            emotion_loader.instance,
+            path,
+            sample_fps=sample_fps,
+            database=db,
+            session_id=session_id,
+            started_at=started_at,
+            on_second=progress
+        )
+        job['status'] = 'done'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    finally:
+        os.remove(path)
+        retire_video_job(job_id)
+
+
+def retire_video_job(job_id):
+    """
+    Keep a finished job for polling, evicting the oldest finished jobs
+    beyond VIDEO_JOBS_KEEP. Their timelines remain in the session's emotion log.
+    """
+    with video_jobs_lock:
+        video_jobs.move_to_end(job_id)
+        finished = [key for key, job in video_jobs.items() if job['status'] in ('done', 'failed')]
+        for key in finished[:max(len(finished) - VIDEO_JOBS_KEEP, 0)]:
+            del video_jobs[key]
+
+
+class FrameStream:
+    """
+    Latest-frame-wins slot for one streaming connection
+    Frames that arrive while inference is busy replace the pending frame,
+    so a slow detector never builds up a backlog of stale frames
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None
+        self.busy = False
+        self.received = 0
+        self.dropped = 0
+
+
+frame_streams = {}
+
+
+@socketio.on('connect', namespace=STREAM_NAMESPACE)
+def stream_connect():
+    """Register a frame stream for the new connection"""
+    frame_streams[request.sid] = FrameStream()
+
+
+@socketio.on('disconnect', namespace=STREAM_NAMESPACE)
+def stream_disconnect():
+    """Forget the connection's frame stream"""
+    frame_streams.pop(request.sid, None)
+
+
+@socketio.on('frame', namespace=STREAM_NAMESPACE)
+def stream_frame(payload):
+    """
+    Receive one binary frame
+    Expects {'image': <jpeg bytes>, 'session_id': ..., 'frame_id': ...}
+    and optionally 'sequence' and 'captured_at' (dropped frames get no reply);
+    the result is pushed back as an 'emotion' event on the same connection
+    """
+    sid = request.sid
+    stream = frame_streams.setdefault(sid, FrameStream())
+    
+    with stream.lock:
+        stream.received += 1
+        if stream.pending is not None:
+            stream.dropped += 1
+        stream.pending = payload
+        if stream.busy:
+            return
+        stream.busy = True
+    
+    socketio.start_background_task(process_frame_stream, sid, stream)
+
+
+def process_frame_stream(sid, stream):
+    """Run detection on a connection's newest pending frame until none is left"""
+    while True:
+        with stream.lock:
+            payload = stream.pending
+            stream.pending = None
+            if payload is None:
+                stream.busy = False
+                return
+        
+        try:
+            if not emotion_loader.ready:
+                raise ValueError('Emotion detection is warming up')
+            
+            if not isinstance(payload, dict) or not payload.get('image'):
+                raise ValueError('No image provided')
+            
+            sequence, captured_at = frame_order(payload)
+            response = detect_and_log(payload['image'], payload.get('session_id'), sequence, captured_at)
+            if response is None:
+                raise ValueError('Invalid image data')
+            if response.get('dropped'):
+                continue
+            if not response['success']:
+                raise RuntimeError(response['error'])
+            response['frame_id'] = payload.get('frame_id')
+            response['frames_dropped'] = stream.dropped
+            socketio.emit('emotion', response, to=sid, namespace=STREAM_NAMESPACE)
+        
+        except Exception as e:
+            socketio.emit('emotion_error', {
+                'error': str(e),
+                'frame_id': payload.get('frame_id') if isinstance(payload, dict) else None
+            }, to=sid, namespace=STREAM_NAMESPACE)
+
+
+def start_chat_turn(data):
+    """
+    Store the user's message and analyze it
+    Returns (session_id, analysis, chatbot context), or None if the message is empty
+    """
+    message = data.get('message', '').strip()
+    session_id = data.get('session_id')
+    current_emotion = data.get('current_emotion')  # From facial detection
+    
+    if not message:
+        return None
+    
+    # Create session if doesn't exist
+    if not session_id:
+        session_id = db.create_session()
+    
+    # Store user message
+    db.add_message(session_id, 'user', message)
+    
+    # Get recent emotion history for context
+    emotion_history = db.get_recent_emotions(session_id, limit=5) if session_id else []
+    
+    # Analyze the message once; crisis flag and response share the analysis
+    analysis = chatbot.analyze(message)
+    
+    context = {
+        'current_emotion': current_emotion,
+        'emotion_history': emotion_history,
+        'conversation_history': db.get_conversation_history(session_id)
+    }
+    return session_id, analysis, context
+
+
 @app.route('/api/chat/message', methods=['POST'])
 def chat_message():
     """
     Handle chat messages and generate therapeutic responses
     """
     try:
-        data = request.get_json()
-        message = data.get('message', '').strip()
-        session_id = data.get('session_id')
-        current_emotion = data.get('current_emotion')  # From facial detection
-        
-        if not message:
+        turn = start_chat_turn(request.get_json())
+        if turn is None:
             return jsonify({'error': 'Message cannot be empty'}), 400
+        session_id, analysis, context = turn
         
-        # Create session if doesn't exist
-        if not session_id:
-            session_id = db.create_session()
-        
-        # Store user message
-        db.add_message(session_id, 'user', message)
-        
-        # Get recent emotion history for context
-        emotion_history = db.get_recent_emotions(session_id, limit=5) if session_id else []
-        
-        # Check for crisis indicators
-        is_crisis = chatbot.detect_crisis(message)
+        is_crisis = chatbot.detect_crisis(analysis)
         
         # Generate therapeutic response
-        response = chatbot.generate_response(
-            message=message,
-            current_emotion=current_emotion,
-            emotion_history=emotion_history,
-            conversation_history=db.get_conversation_history(session_id)
-        )
+        response = chatbot.generate_response(message=analysis, **context)
         
         # Store bot response
         db.add_message(session_id, 'assistant', response)
@@ -136,13 +688,91 @@ def chat_message():
             'response': response,
             'session_id': session_id,
             'timestamp': datetime.now().isoformat(),
-            'crisis_detected': is_crisis
+            'crisis_detected': is_crisis,
+            'sentiment': analysis.sentiment
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Handle a chat message and stream the response as server-sent events
+    Sends 'start' with the session and crisis flag, a 'token' event per piece
+    of the response as the model produces it, then 'done' with the full
+    response once it is stored ('error' if generation fails)
+    """
+    try:
+        turn = start_chat_turn(request.get_json())
+        if turn is None:
+            return jsonify({'error': 'Message cannot be empty'}), 400
+        session_id, analysis, context = turn
+        is_crisis = chatbot.detect_crisis(analysis)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def events():
+        pieces = []
+        stored = False
+        try:
+            yield sse_event('start', {
+                'session_id': session_id,
+                'crisis_detected': is_crisis,
+                'sentiment': analysis.sentiment
+            })
+            
+            for piece in chatbot.stream_response(analysis, **context):
+                pieces.append(piece)
+                yield sse_event('token', {'text': piece})
+            
+            # Store bot response once the stream is complete
+            response = ''.join(pieces).strip()
+            db.add_message(session_id, 'assistant', response)
+            stored = True
+            
+            yield sse_event('done', {
+                'success': True,
+                'response': response,
+                'session_id': session_id,
+                'timestamp': datetime.now().isoformat(),
+                'crisis_detected': is_crisis
+            })
+        
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event('error', {'error': str(e)})
+        
+        finally:
+            # Keep what the user already saw if the stream broke off or they left
+            if not stored and pieces:
+                db.add_message(session_id, 'assistant', ''.join(pieces).strip())
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Keep reverse proxies from buffering the stream
+    })
+
+
+@app.route('/api/chat/stats', methods=['GET'])
+def get_chat_stats():
+    """Get chatbot response mode and LLM call statistics"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': chatbot.get_stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/session/create', methods=['POST'])
 def create_session():
     """Create a new therapy session"""
@@ -0,0 +1,176 @@
+"""
+Dynamic micro-batching for emotion detection
+Collects concurrent single-frame requests for a few milliseconds and
+classifies their faces as one batch
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class MicroBatchScheduler:
+    """
+    Micro-batching front end for EmotionDetector or InferencePool
+    detect_emotions() blocks until the caller's frame has been classified as
+    part of a batch of up to max_batch frames gathered within max_wait_ms.
+
+    With an EmotionDetector, each caller prepares its own frame (prefilter,
+    face detection, crops) in its own thread, as the stage pipeline does, and
+    only frames with faces left to classify are queued; cached and rejected
+    frames return at once. An InferencePool has no such split, so whole
+    frames are queued and batched through detect_emotions_batch.
+    """
+
+    def __init__(self, detector, max_batch=None, max_wait_ms=None, concurrency=None):
+        """
+        Args:
+            detector: Object with detect_emotions_batch(images, session_ids),
+                and optionally prepare/classify_faces/finish as on EmotionDetector
+            max_batch: Largest batch to form. Defaults to BATCH_MAX_SIZE, then 16.
+            max_wait_ms: Longest a batch waits for more frames after its first
+                one arrived. Defaults to BATCH_MAX_WAIT_MS, then 5.
+            concurrency: Batches allowed in flight at once. Defaults to
+                BATCH_CONCURRENCY, then 1.
+        """
+        self.detector = detector
+        self.prepares = hasattr(detector, 'prepare')
+        self.max_batch = max_batch or int(os.getenv('BATCH_MAX_SIZE', '16'))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv('BATCH_MAX_WAIT_MS', '5'))) / 1000
+        self.concurrency = concurrency or int(os.getenv('BATCH_CONCURRENCY', '1'))
+
+        # Metrics
+        self.metrics_lock = threading.Lock()
+        self.max_queue_depth = 0
+        self.batches = 0
+        self.frames = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+
+        self.pid = None
+        self._start_dispatcher()
+
+    def _start_dispatcher(self):
+        """
+        Create the queue, executor and dispatcher thread for this process
+        Threads do not survive fork, so a pre-forked worker starts its own
+        """
+        self.pid = os.getpid()
+        self.queue = queue.Queue()
+        self.slots = threading.Semaphore(self.concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self.dispatcher.start()
+
+    def detect_emotions(self, image, session_id=None):
+        """Queue one frame, or its prepared faces, and wait for its result"""
+        if self.pid != os.getpid():
+            with self.metrics_lock:
+                if self.pid != os.getpid():
+                    self._start_dispatcher()
+
+        item = image
+        if self.prepares:
+            try:
+                result, item = self.detector.prepare(image, session_id)
+            except Exception as e:
+                print(f"Emotion detection error: {e}")
+                return self.detector._error_result(e)
+            if result is not None:
+                return result
+
+        future = Future()
+        self.queue.put((item, session_id, future, time.monotonic()))
+
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            with self.metrics_lock:
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+
+        return future.result()
+
+    def detect_emotions_batch(self, images, session_ids=None):
+        """Already-batched requests go straight to the detector"""
+        return self.detector.detect_emotions_batch(images, session_ids)
+
+    def _dispatch_loop(self):
+        """Form batches from the queue and hand them to the executor"""
+        while True:
+            self.slots.acquire()
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self.queue.get(timeout=remaining))
+                    else:
+                        batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        """Run one batch and deliver each result to its caller"""
+        try:
+            started = time.monotonic()
+            with self.metrics_lock:
+                self.batches += 1
+                self.frames += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.total_wait += sum(started - queued_at for _, _, _, queued_at in batch)
+
+            try:
+                if self.prepares:
+                    results = self._classify_prepared([pending for pending, _, _, _ in batch])
+                else:
+                    results = self.detector.detect_emotions_batch(
+                        [image for image, _, _, _ in batch],
+                        [session_id for _, session_id, _, _ in batch]
+                    )
+                for (_, _, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+        finally:
+            self.slots.release()
+
+    def _classify_prepared(self, batch):
+        """One forward pass over the faces of every prepared frame in the batch"""
+        face_crops = [crop for pending in batch for crop in pending[1]]
+        try:
+            predictions = self.detector.classify_faces(face_crops)
+        except Exception as e:
+            print(f"Batch classification error: {e}")
+            return [self.detector._error_result(e) for _ in batch]
+
+        results = []
+        offset = 0
+        for pending in batch:
+            count = len(pending[0])
+            results.append(self.detector.finish(pending, predictions[offset:offset + count]))
+            offset += count
+        return results
+
+    def get_stats(self):
+        """Get detector statistics plus batching and queue-depth metrics"""
+        stats = self.detector.get_stats()
+        with self.metrics_lock:
+            stats['scheduler'] = {
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'batches': self.batches,
+                'frames': self.frames,
+                'mean_batch_size': self.frames / self.batches if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'mean_queue_wait_ms': 1000 * self.total_wait / self.frames if self.frames else 0.0,
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000
+            }
+        return stats
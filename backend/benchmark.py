@@ -0,0 +1,305 @@
+"""
+Benchmark script for the emotion detection path
+Measures per-frame latency of the detector over a local image set, and chat
+keyword scanning over long messages, and the chatbot's LLM path under
+concurrent load against the mock LLM server
+
+Usage:
+    python benchmark.py pipeline --images ./frames --repeat 5
+    python benchmark.py decode --images ./frames --repeat 20
+    python benchmark.py resolution --images ./frames --min-face-size 120
+    python benchmark.py faces --images ./frames
+    python benchmark.py keywords --words 2000
+    python benchmark.py chat --concurrency 20 --latency lognormal:800:0.6 --deadline 2
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from emotion_detector import EmotionDetector, decode_frame
+from face_detectors import FACE_DETECTORS, create_face_detector
+from chatbot import KEYWORD_CATEGORIES, KEYWORDS, TherapeuticChatbot
+from keyword_matcher import KeywordMatcher
+from llm_client import LLMClient
+from mock_llm_server import MockLLMServer
+
+IMAGE_EXTENSIONS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+def load_images(image_dir, limit=None):
+    """Load images from a directory, or synthesize 640x480 frames if none given"""
+    images = []
+    if image_dir:
+        paths = []
+        for pattern in IMAGE_EXTENSIONS:
+            paths.extend(glob.glob(os.path.join(image_dir, pattern)))
+        for path in sorted(paths)[:limit]:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append(image)
+
+    if not images:
+        print("Warning: no images found, using synthetic 640x480 frames (no faces)")
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(limit or 20)]
+
+    return images
+
+
+def time_calls(func, items, repeat):
+    """Call func on every item, repeat times, and return latencies in ms"""
+    latencies = []
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            func(item)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(name, latencies):
+    """Print latency percentiles for one benchmark run"""
+    values = np.asarray(latencies)
+    print(f"{name:<24} n={len(values):<5} "
+          f"mean={values.mean():8.2f}ms  p50={np.percentile(values, 50):8.2f}ms  "
+          f"p95={np.percentile(values, 95):8.2f}ms  p99={np.percentile(values, 99):8.2f}ms")
+
+
+def bench_pipeline(args):
+    """Compare per-frame latency of the legacy and single-pass pipelines"""
+    images = load_images(args.images, args.limit)
+    print(f"Benchmarking {len(images)} frames x {args.repeat} repeats")
+
+    for pipeline in EmotionDetector.PIPELINES:
+        detector = EmotionDetector(pipeline=pipeline)
+        # Warm up so model loading and first-call allocation are not measured
+        detector.detect_emotions(images[0])
+        summarize(pipeline, time_calls(detector.detect_emotions, images, args.repeat))
+
+
+def bench_decode(args):
+    """Compare decode throughput of base64-in-JSON uploads against raw JPEG bodies"""
+    images = load_images(args.images, args.limit)
+    jpegs = [cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes() for image in images]
+    json_bodies = [
+        json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode('ascii'),
+                    'session_id': 'benchmark'}).encode('utf-8')
+        for jpeg in jpegs
+    ]
+
+    def decode_json(body):
+        data = json.loads(body)
+        image_data = data['image'].split(',')[1] if ',' in data['image'] else data['image']
+        return cv2.imdecode(np.frombuffer(base64.b64decode(image_data), np.uint8), cv2.IMREAD_COLOR)
+
+    def decode_raw(body):
+        return cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+
+    print(f"Benchmarking {len(images)} frames x {args.repeat} repeats")
+    for name, func, bodies in (('json_base64', decode_json, json_bodies), ('raw_jpeg', decode_raw, jpegs)):
+        latencies = time_calls(func, bodies, args.repeat)
+        mean_bytes = sum(len(body) for body in bodies) / len(bodies)
+        summarize(name, latencies)
+        print(f"{'':<24} payload={mean_bytes / 1024:8.1f}KiB  throughput={1000 / np.mean(latencies):8.1f} frames/s")
+
+
+RESOLUTIONS = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080)
+}
+
+
+def bench_resolution(args):
+    """
+    Compare full-resolution decode + detection against reduced decode and
+    downscaled detection at 480p, 720p and 1080p input
+    """
+    images = load_images(args.images, args.limit)
+    full = EmotionDetector(tracking=False, frame_cache=False, min_face_size=0)
+    scaled = EmotionDetector(tracking=False, frame_cache=False, min_face_size=args.min_face_size)
+    print(f"Benchmarking {len(images)} frames x {args.repeat} repeats, "
+          f"min face size {args.min_face_size}px, decode reduction {args.reduction}")
+
+    for name, (width, height) in RESOLUTIONS.items():
+        jpegs = [
+            cv2.imencode('.jpg', cv2.resize(image, (width, height)), [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+            for image in images
+        ]
+        reduced_detector = EmotionDetector(
+            tracking=False, frame_cache=False,
+            min_face_size=max(args.min_face_size // args.reduction, 0)
+        )
+
+        def full_path(jpeg):
+            return full.detect_faces(decode_frame(jpeg, reduction=1))
+
+        def scaled_path(jpeg):
+            return scaled.detect_faces(decode_frame(jpeg, reduction=1))
+
+        def reduced_path(jpeg):
+            return reduced_detector.detect_faces(decode_frame(jpeg, reduction=args.reduction))
+
+        print(f"\n{name} ({width}x{height})")
+        summarize('full', time_calls(full_path, jpegs, args.repeat))
+        summarize('downscaled_detect', time_calls(scaled_path, jpegs, args.repeat))
+        summarize(f'reduced_decode_{args.reduction}', time_calls(reduced_path, jpegs, args.repeat))
+
+
+def bench_faces(args):
+    """Per-frame latency percentiles and detection counts for every face detector backend"""
+    images = load_images(args.images, args.limit)
+    grays = [cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) for image in images]
+    print(f"Benchmarking {len(images)} frames x {args.repeat} repeats")
+
+    for name in sorted(FACE_DETECTORS):
+        try:
+            backend = create_face_detector(name)
+        except Exception as e:
+            print(f"{name:<24} skipped: {e}")
+            continue
+
+        frames = images if backend.needs_color else grays
+        counts = [len(backend.detect(frame)) for frame in frames]
+        summarize(name, time_calls(backend.detect, frames, args.repeat))
+        print(f"{'':<24} faces={sum(counts)}  frames_with_faces={sum(1 for c in counts if c)}/{len(counts)}")
+
+
+def bench_keywords(args):
+    """Per-category substring scans vs the compiled keyword matcher on long chat messages"""
+    rng = random.Random(0)
+    filler = ('i have been thinking about work and home and how the week went '
+              'it was a long day and then there was the commute again').split()
+    categories = dict(KEYWORD_CATEGORIES)
+    matcher = KEYWORDS
+    if args.extra_keywords:
+        # Simulate growing keyword lists with made-up words
+        categories['extra'] = [f"keyword{i}" for i in range(args.extra_keywords)]
+        matcher = KeywordMatcher(categories)
+    keywords = sorted({keyword for words in KEYWORD_CATEGORIES.values() for keyword in words})
+    messages = []
+    for _ in range(args.messages):
+        words = [rng.choice(filler) for _ in range(args.words)]
+        for _ in range(max(1, args.words // 100)):
+            words[rng.randrange(len(words))] = rng.choice(keywords)
+        messages.append(' '.join(words))
+    print(f"Benchmarking {len(messages)} messages of {args.words} words x {args.repeat} repeats, "
+          f"{sum(len(words) for words in categories.values())} keywords")
+
+    def substring_scans(message):
+        # What the chatbot did before: lowercase and scan once per keyword, per category
+        message_lower = message.lower()
+        return {
+            name: sum(1 for keyword in words if keyword in message_lower)
+            for name, words in categories.items()
+        }
+
+    summarize('substring_scans', time_calls(substring_scans, messages, args.repeat))
+    summarize('keyword_matcher', time_calls(matcher.scan, messages, args.repeat))
+
+
+def bench_chat(args):
+    """Concurrent chatbot responses through the pooled LLM client: latency, time to first piece, fallbacks"""
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = MockLLMServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                               error_rate=args.error_rate, seed=0)
+        base_url = server.start()
+    print(f"Benchmarking {args.requests} {'streamed ' if args.stream else ''}responses, "
+          f"{args.concurrency} concurrent, deadline {args.deadline}s, against {base_url}")
+
+    chatbot = TherapeuticChatbot(base_url=base_url)
+    chatbot.llm_client = LLMClient(os.getenv('OPENAI_API_KEY') or 'unused', base_url=base_url,
+                                   deadline=args.deadline, max_connections=args.concurrency)
+    messages = ["I've been feeling really stressed about work lately",
+                "I'm just so sad all the time",
+                "I'm terrified about my upcoming presentation"]
+
+    def respond(i):
+        start = time.perf_counter()
+        first = None
+        if args.stream:
+            for _ in chatbot.stream_response(messages[i % len(messages)]):
+                if first is None:
+                    first = (time.perf_counter() - start) * 1000
+        else:
+            chatbot.generate_response(messages[i % len(messages)])
+        return (time.perf_counter() - start) * 1000, first
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(respond, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    summarize('response', [total for total, _ in results])
+    if args.stream:
+        summarize('first_piece', [first for _, first in results])
+    stats = chatbot.llm_client.stats()
+    print(f"{args.requests / elapsed:.1f} responses/s; completed={stats['completed']} "
+          f"timeouts={stats['timeouts']} errors={stats['errors']} "
+          f"(rule-based fallbacks: {stats['timeouts'] + stats['errors']})")
+    if server:
+        print(f"mock server: {server.stats()}")
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emotion detection and chat benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help='Legacy vs single-pass per-frame latency')
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    decode_parser = subparsers.add_parser('decode', help='JSON/base64 vs raw JPEG upload decode throughput')
+    decode_parser.set_defaults(func=bench_decode)
+
+    resolution_parser = subparsers.add_parser('resolution', help='Reduced decode / downscaled detection at 480p-1080p')
+    resolution_parser.add_argument('--min-face-size', type=int, default=120,
+                                   help='Smallest face to detect, in full-resolution pixels')
+    resolution_parser.add_argument('--reduction', type=int, default=2, choices=[2, 4, 8],
+                                   help='JPEG decode reduction factor')
+    resolution_parser.set_defaults(func=bench_resolution)
+
+    faces_parser = subparsers.add_parser('faces', help='Compare face detector backends')
+    faces_parser.set_defaults(func=bench_faces)
+
+    for sub in (pipeline_parser, decode_parser, resolution_parser, faces_parser):
+        sub.add_argument('--images', help='Directory of test images')
+        sub.add_argument('--limit', type=int, default=None, help='Maximum number of images to load')
+        sub.add_argument('--repeat', type=int, default=3, help='Passes over the image set')
+
+    keywords_parser = subparsers.add_parser('keywords', help='Chat keyword scanning on long messages')
+    keywords_parser.add_argument('--words', type=int, default=2000, help='Words per message')
+    keywords_parser.add_argument('--messages', type=int, default=50, help='Number of messages')
+    keywords_parser.add_argument('--repeat', type=int, default=5, help='Passes over the messages')
+    keywords_parser.add_argument('--extra-keywords', type=int, default=0, help='Synthetic keywords to add')
+    keywords_parser.set_defaults(func=bench_keywords)
+
+    chat_parser = subparsers.add_parser('chat', help='Concurrent chatbot responses via the LLM client')
+    chat_parser.add_argument('--requests', type=int, default=200, help='Number of responses')
+    chat_parser.add_argument('--concurrency', type=int, default=20, help='Responses generated at once')
+    chat_parser.add_argument('--deadline', type=float, default=8, help='LLM call deadline in seconds')
+    chat_parser.add_argument('--stream', action='store_true', help='Stream responses')
+    chat_parser.add_argument('--base-url', help='OpenAI-compatible server (default: start the mock server)')
+    chat_parser.add_argument('--latency', default='lognormal:500:0.5',
+                             help='Mock server time to first token distribution in ms')
+    chat_parser.add_argument('--tokens-per-second', type=float, default=100, help='Mock server token rate')
+    chat_parser.add_argument('--error-rate', type=float, default=0.0, help='Mock server error rate')
+    chat_parser.set_defaults(func=bench_chat)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
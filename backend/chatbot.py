@@ -8,32 +8,102 @@ import json
 from datetime import datetime
 import re
 
+from keyword_matcher import KeywordMatcher, tokenize
+
 try:
-    from openai import OpenAI
+    from llm_client import LLMClient
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
     print("Warning: OpenAI library not available. Using rule-based responses.")
 
 
+# Keyword categories scanned for in every message (whole words or phrases)
+KEYWORD_CATEGORIES = {
+    # Enhanced keywords for different emotional states
+    'stress': ['stressed', 'overwhelmed', 'pressure', 'anxious', 'worried', 'panic',
+               'tension', 'nervous', 'worries', 'stressing', 'overwhelm'],
+    'sadness': ['sad', 'depressed', 'down', 'hopeless', 'empty', 'lonely', 'miserable',
+                'unhappy', 'sorrow', 'grief', 'melancholy', 'blue', 'downhearted'],
+    'anger': ['angry', 'furious', 'mad', 'frustrated', 'annoyed', 'irritated', 'rage',
+              'livid', 'enraged', 'resentful', 'bitter', 'hostile'],
+    'fear': ['afraid', 'scared', 'fear', 'terrified', 'worried', 'nervous', 'anxious',
+             'panic', 'dread', 'apprehensive', 'frightened', 'intimidated'],
+    # One list drives both the crisis flag and the crisis response. Matched as
+    # word prefixes (see KEYWORDS), so 'overdose' also catches 'overdosed' and
+    # 'self harm' catches 'self-harming'; forms that change the stem are listed
+    'crisis': ['suicide', 'suicidal', 'kill myself', 'end it all', 'not worth living',
+               'want to die', 'hurt myself', 'self harm', 'cutting', 'overdose',
+               'overdosing', 'no point', 'give up', 'giving up', 'end my life'],
+    # Rule-based response triggers
+    'greeting': ['hello', 'hi', 'hey', 'start', 'begin'],
+    'feeling': ['feel', 'feeling', 'emotion'],
+    'reassurance': ['fine', 'okay', 'ok']
+}
+
+# Crisis keywords must not miss inflected forms, so they match word prefixes
+KEYWORDS = KeywordMatcher(KEYWORD_CATEGORIES, prefix_categories=('crisis',))
+
+
+class MessageAnalysis:
+    """
+    Everything derived from a message's text, computed once per message
+    Shared by crisis detection, sentiment, the rule engine and prompt
+    building, so they all see the same keyword hits and crisis decision
+    """
+    
+    def __init__(self, message):
+        self.text = message
+        self.normalized = message.lower()
+        self.tokens = tokenize(self.normalized)
+        self.word_count = len(message.split())
+        self.keyword_hits = KEYWORDS.match(self.normalized, self.tokens)
+        self.keyword_counts = KEYWORDS.count(self.keyword_hits)
+        self.crisis = self.keyword_counts['crisis'] > 0
+        self.sentiment = self._sentiment()
+    
+    def _sentiment(self):
+        """Dominant sentiment: 'crisis' first, then the category with most keyword hits"""
+        # Check for crisis first (highest priority)
+        if self.crisis:
+            return 'crisis'
+        
+        scores = [(name, self.keyword_counts[name]) for name in ('stress', 'sadness', 'anger', 'fear')]
+        scores.append(('neutral', 0))
+        max_sentiment = max(scores, key=lambda x: x[1])
+        return max_sentiment[0] if max_sentiment[1] > 0 else 'neutral'
+    
+    def has(self, *keywords):
+        """Whether any of the given keywords occurs in the message"""
+        return any(keyword in self.keyword_hits for keyword in keywords)
+
+
 class TherapeuticChatbot:
     """
     Therapeutic chatbot that provides empathetic, non-judgmental responses
     Similar to responses from a licensed counselor
     """
     
-    def __init__(self):
-        """Initialize chatbot with therapeutic guidelines"""
+    def __init__(self, base_url=None):
+        """
+        Initialize chatbot with therapeutic guidelines
+        
+        Args:
+            base_url: API root of an OpenAI-compatible server, e.g. the mock
+                server at http://127.0.0.1:8001/v1. Defaults to OPENAI_BASE_URL,
+                then the OpenAI API. A custom server needs no OPENAI_API_KEY.
+        """
         self.system_prompt = self._get_therapeutic_system_prompt()
-        self.openai_client = None
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL') or None
+        self.llm_client = None
         self.conversation_memory = {}  # Store conversation context per session
         
         if OPENAI_AVAILABLE:
             api_key = os.getenv('OPENAI_API_KEY')
-            if api_key:
+            if api_key or self.base_url:
                 try:
-                    self.openai_client = OpenAI(api_key=api_key)
-                    print("OpenAI client initialized successfully")
+                    self.llm_client = LLMClient(api_key or 'unused', base_url=self.base_url)
+                    print(f"OpenAI client initialized successfully ({self.base_url or 'api.openai.com'})")
                 except Exception as e:
                     print(f"Warning: Could not initialize OpenAI client: {e}")
             else:
@@ -62,12 +132,16 @@ Guidelines:
 
 Remember: You are not a replacement for professional therapy, but you can provide supportive listening and emotional validation."""
 
+    def analyze(self, message):
+        """Analyze a message once; pass the result on to the other methods"""
+        return message if isinstance(message, MessageAnalysis) else MessageAnalysis(message)
+    
     def generate_response(self, message, current_emotion=None, emotion_history=None, conversation_history=None):
         """
         Generate therapeutic response based on message and emotional context
         
         Args:
-            message: User's message
+            message: User's message, or its MessageAnalysis
             current_emotion: Current detected emotion from facial recognition
             emotion_history: List of recent emotions
             conversation_history: Previous conversation messages
@@ -76,46 +150,32 @@ Remember: You are not a replacement for professional therapy, but you can provid
             Therapeutic response string
         """
         # Analyze sentiment and emotional state
-        sentiment = self._analyze_sentiment(message)
+        analysis = self.analyze(message)
         emotional_context = self._build_emotional_context(current_emotion, emotion_history)
         
         # Use OpenAI if available, otherwise use rule-based
-        if self.openai_client:
-            return self._generate_openai_response(message, sentiment, emotional_context, conversation_history)
+        if self.llm_client:
+            return self._generate_openai_response(analysis, emotional_context, conversation_history)
         else:
-            return self._generate_rule_based_response(message, sentiment, emotional_context)
+            return self._generate_rule_based_response(analysis, emotional_context)
+    
+    def stream_response(self, message, current_emotion=None, emotion_history=None, conversation_history=None):
+        """
+        Like generate_response, but yields the response in pieces as the model
+        produces them, so the first words can be shown before the rest exists
+        Rule-based responses arrive as a single piece
+        """
+        analysis = self.analyze(message)
+        emotional_context = self._build_emotional_context(current_emotion, emotion_history)
+        
+        if self.llm_client:
+            yield from self._stream_openai_response(analysis, emotional_context, conversation_history)
+        else:
+            yield self._generate_rule_based_response(analysis, emotional_context)
     
     def _analyze_sentiment(self, message):
         """Analyze sentiment of the message with enhanced keyword detection"""
-        message_lower = message.lower()
-        
-        # Enhanced keywords for different emotional states
-        stress_keywords = ['stressed', 'overwhelmed', 'pressure', 'anxious', 'worried', 'panic', 
-                          'tension', 'nervous', 'worries', 'stressing', 'overwhelm']
-        sadness_keywords = ['sad', 'depressed', 'down', 'hopeless', 'empty', 'lonely', 'miserable',
-                           'unhappy', 'sorrow', 'grief', 'melancholy', 'blue', 'downhearted']
-        anger_keywords = ['angry', 'furious', 'mad', 'frustrated', 'annoyed', 'irritated', 'rage',
-                         'livid', 'enraged', 'resentful', 'bitter', 'hostile']
-        fear_keywords = ['afraid', 'scared', 'fear', 'terrified', 'worried', 'nervous', 'anxious',
-                        'panic', 'dread', 'apprehensive', 'frightened', 'intimidated']
-        crisis_keywords = ['suicide', 'kill myself', 'end it all', 'not worth living', 'want to die',
-                          'hurt myself', 'self harm', 'cutting', 'overdose']
-        
-        sentiment = {
-            'crisis': sum(1 for phrase in crisis_keywords if phrase in message_lower),
-            'stress': sum(1 for word in stress_keywords if word in message_lower),
-            'sadness': sum(1 for word in sadness_keywords if word in message_lower),
-            'anger': sum(1 for word in anger_keywords if word in message_lower),
-            'fear': sum(1 for word in fear_keywords if word in message_lower),
-            'neutral': 0
-        }
-        
-        # Check for crisis first (highest priority)
-        if sentiment['crisis'] > 0:
-            return 'crisis'
-        
-        max_sentiment = max([(k, v) for k, v in sentiment.items() if k != 'crisis'], key=lambda x: x[1])
-        return max_sentiment[0] if max_sentiment[1] > 0 else 'neutral'
+        return self.analyze(message).sentiment
     
     def _build_emotional_context(self, current_emotion, emotion_history):
         """Build emotional context from facial recognition data"""
@@ -133,54 +193,90 @@ Remember: You are not a replacement for professional therapy, but you can provid
         
         return context
     
-    def _generate_openai_response(self, message, sentiment, emotional_context, conversation_history):
-        """Generate response using OpenAI API (v1.0+)"""
+    def _build_openai_messages(self, analysis, emotional_context, conversation_history):
+        """Build the chat.completions messages: system prompt with context, history, message"""
+        # Build conversation context
+        system_content = self.system_prompt
+        
+        # Add emotional context to system message
+        if emotional_context['current'] or emotional_context['recent_pattern']:
+            context_note = "\n\nUser's current emotional state: "
+            if emotional_context['current']:
+                context_note += f"detected emotion: {emotional_context['current']}. "
+            if emotional_context['recent_pattern']:
+                context_note += f"Recent emotional pattern: {emotional_context['recent_pattern']}. "
+            system_content += context_note
+        
+        # Add crisis detection warning if needed
+        if analysis.crisis:
+            system_content += "\n\n⚠️ CRISIS DETECTED: The user may be in crisis. Respond with immediate concern, validation, and provide crisis resources. Be supportive but also encourage professional help."
+        
+        messages = [{"role": "system", "content": system_content}]
+        
+        # Add conversation history
+        if conversation_history:
+            for msg in conversation_history[-10:]:  # Last 10 messages for context
+                role = "user" if msg.get('role') == 'user' else "assistant"
+                messages.append({"role": role, "content": msg.get('content', '')})
+        
+        # Add current message
+        messages.append({"role": "user", "content": analysis.text})
+        return messages
+    
+    def _generate_openai_response(self, analysis, emotional_context, conversation_history):
+        """Generate response using OpenAI API, falling back to rule-based past the deadline"""
         try:
-            # Build conversation context
-            system_content = self.system_prompt
-            
-            # Add emotional context to system message
-            if emotional_context['current'] or emotional_context['recent_pattern']:
-                context_note = "\n\nUser's current emotional state: "
-                if emotional_context['current']:
-                    context_note += f"detected emotion: {emotional_context['current']}. "
-                if emotional_context['recent_pattern']:
-                    context_note += f"Recent emotional pattern: {emotional_context['recent_pattern']}. "
-                system_content += context_note
-            
-            # Add crisis detection warning if needed
-            if sentiment == 'crisis':
-                system_content += "\n\n⚠️ CRISIS DETECTED: The user may be in crisis. Respond with immediate concern, validation, and provide crisis resources. Be supportive but also encourage professional help."
-            
-            messages = [{"role": "system", "content": system_content}]
-            
-            # Add conversation history
-            if conversation_history:
-                for msg in conversation_history[-10:]:  # Last 10 messages for context
-                    role = "user" if msg.get('role') == 'user' else "assistant"
-                    messages.append({"role": role, "content": msg.get('content', '')})
-            
-            # Add current message
-            messages.append({"role": "user", "content": message})
-            
-            # Call OpenAI API (new format)
-            response = self.openai_client.chat.completions.create(
+            return self.llm_client.complete(
+                self._build_openai_messages(analysis, emotional_context, conversation_history),
                 model="gpt-3.5-turbo",
-                messages=messages,
                 temperature=0.7,
                 max_tokens=300
-            )
-            
-            return response.choices[0].message.content.strip()
+            ).strip()
         
         except Exception as e:
             print(f"OpenAI API error: {e}")
             # Fallback to rule-based
-            return self._generate_rule_based_response(message, sentiment, emotional_context)
+            return self._generate_rule_based_response(analysis, emotional_context)
+    
+    def _stream_openai_response(self, analysis, emotional_context, conversation_history):
+        """Yield the OpenAI response as it is generated, falling back to rule-based"""
+        pieces = self.llm_client.stream(
+            self._build_openai_messages(analysis, emotional_context, conversation_history),
+            model="gpt-3.5-turbo",
+            temperature=0.7,
+            max_tokens=300
+        )
+        started = False
+        try:
+            for text in pieces:
+                if not started:
+                    text = text.lstrip()
+                if text:
+                    started = True
+                    yield text
+        
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            # Fallback to rule-based, unless part of the answer was already sent
+            if not started:
+                yield self._generate_rule_based_response(analysis, emotional_context)
+        
+        finally:
+            # Also runs when the client goes away mid-stream: cancel the upstream request
+            pieces.close()
     
-    def _generate_rule_based_response(self, message, sentiment, emotional_context):
+    def get_stats(self):
+        """Get the response mode and LLM call statistics"""
+        return {
+            'mode': 'openai' if self.llm_client else 'rule_based',
+            'base_url': self.base_url,
+            'llm': self.llm_client.stats() if self.llm_client else None
+        }
+    
+    def _generate_rule_based_response(self, analysis, emotional_context):
         """Generate therapeutic response using rule-based logic"""
-        message_lower = message.lower()
+        sentiment = analysis.sentiment
+        counts = analysis.keyword_counts
         
         # CRISIS DETECTION - Highest priority
         if sentiment == 'crisis':
@@ -192,7 +288,7 @@ Remember: You are not a replacement for professional therapy, but you can provid
             return self._select_response(crisis_responses, emotional_context)
         
         # Greeting responses
-        if any(word in message_lower for word in ['hello', 'hi', 'hey', 'start', 'begin']):
+        if counts['greeting']:
             greeting_responses = [
                 "Hello. I'm here to listen and support you. How are you feeling today? You can share whatever's on your mind, and I'll be here with you.",
                 "Hi there. Thank you for reaching out. I'm here to provide a safe space for you to express yourself. What's on your mind today?",
@@ -201,7 +297,7 @@ Remember: You are not a replacement for professional therapy, but you can provid
             return self._select_response(greeting_responses, emotional_context)
         
         # Stress/Anxiety responses
-        if sentiment == 'stress' or 'stressed' in message_lower or 'anxious' in message_lower:
+        if sentiment == 'stress' or analysis.has('stressed', 'anxious'):
             responses = [
                 "I can hear that you're feeling stressed right now. That sounds really difficult. Can you tell me more about what's contributing to these feelings?",
                 "It sounds like you're experiencing a lot of pressure. That must be overwhelming. What would help you feel a bit more grounded right now?",
@@ -210,7 +306,7 @@ Remember: You are not a replacement for professional therapy, but you can provid
             return self._select_response(responses, emotional_context)
         
         # Sadness responses
-        if sentiment == 'sadness' or 'sad' in message_lower or 'depressed' in message_lower:
+        if sentiment == 'sadness' or analysis.has('sad', 'depressed'):
             responses = [
                 "I hear the sadness in what you're sharing. Thank you for trusting me with these feelings. Can you help me understand what's been making you feel this way?",
                 "It sounds like you're going through a really tough time. Your feelings are valid, and I'm here to listen. What's been on your mind lately?",
@@ -219,7 +315,7 @@ Remember: You are not a replacement for professional therapy, but you can provid
             return self._select_response(responses, emotional_context)
         
         # Anger responses
-        if sentiment == 'anger' or 'angry' in message_lower or 'frustrated' in message_lower:
+        if sentiment == 'anger' or analysis.has('angry', 'frustrated'):
             responses = [
                 "I can hear the frustration in your words. It sounds like something has really upset you. Can you help me understand what happened?",
                 "It seems like you're feeling angry, and that's completely understandable. What's been making you feel this way?",
@@ -228,7 +324,7 @@ Remember: You are not a replacement for professional therapy, but you can provid
             return self._select_response(responses, emotional_context)
         
         # Fear responses
-        if sentiment == 'fear' or 'afraid' in message_lower or 'scared' in message_lower:
+        if sentiment == 'fear' or analysis.has('afraid', 'scared'):
             responses = [
                 "I can sense that you're feeling afraid or worried. That must be really unsettling. Can you tell me more about what's causing these feelings?",
                 "It sounds like fear is really present for you right now. That's a difficult emotion to sit with. What would help you feel a bit safer?",
@@ -237,16 +333,16 @@ Remember: You are not a replacement for professional therapy, but you can provid
             return self._select_response(responses, emotional_context)
         
         # Questions about feelings
-        if any(word in message_lower for word in ['feel', 'feeling', 'emotion']):
+        if counts['feeling']:
             return "I appreciate you sharing how you're feeling. Can you tell me more about what's behind these feelings? Sometimes exploring them can help us understand ourselves better."
         
         # General empathetic responses
-        if len(message.split()) < 5:
+        if analysis.word_count < 5:
             return "I'm listening. Can you tell me more about what's on your mind?"
         
         # Check for emotional mismatch (user says fine but emotion shows otherwise)
         if emotional_context['current'] and emotional_context['current'] != 'neutral':
-            if 'fine' in message_lower or 'okay' in message_lower or 'ok' in message_lower:
+            if counts['reassurance']:
                 mismatch_responses = [
                     f"I hear you say you're doing okay, and I want to respect that. I'm also noticing that you might be feeling {emotional_context['current']} right now. Sometimes it can be hard to put words to our feelings. Would you like to talk about what's going on?",
                     "Thank you for sharing. I want to acknowledge that sometimes our words and our feelings don't always match up, and that's okay. If you'd like to explore what you're experiencing, I'm here to listen.",
@@ -282,14 +378,8 @@ Remember: You are not a replacement for professional therapy, but you can provid
         return random.choice(responses)
     
     def detect_crisis(self, message):
-        """Detect if message indicates a mental health crisis"""
-        message_lower = message.lower()
-        crisis_indicators = [
-            'suicide', 'kill myself', 'end it all', 'not worth living',
-            'want to die', 'hurt myself', 'self harm', 'cutting',
-            'overdose', 'no point', 'give up', 'end my life'
-        ]
-        return any(indicator in message_lower for indicator in crisis_indicators)
+        """Detect if message (text or MessageAnalysis) indicates a mental health crisis"""
+        return self.analyze(message).crisis
 
 
 if __name__ == '__main__':
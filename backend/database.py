@@ -187,9 +187,9 @@ class Database:
             rows = self.cursor.fetchall()
             return [{'role': row[0], 'content': row[1], 'timestamp': row[2]} for row in rows]
     
-    def log_emotion(self, session_id, emotion_data):
-        """Log detected emotion"""
-        timestamp = datetime.now().isoformat()
+    def log_emotion(self, session_id, emotion_data, timestamp=None):
+        """Log detected emotion (at timestamp, default now)"""
+        timestamp = timestamp or datetime.now().isoformat()
         dominant_emotion = emotion_data.get('dominant_emotion', 'neutral')
         emotions_json = json.dumps(emotion_data.get('emotions', {}))
         confidence = emotion_data.get('confidence', 0.0)
@@ -0,0 +1,257 @@
+"""
+Emotion Classifier Backends
+Registry of interchangeable classifiers for 7-class facial emotion
+recognition on grayscale face crops: FER (Keras/TensorFlow) and ONNX Runtime
+
+Export and quantize the FER model for the ONNX backend:
+    python emotion_classifiers.py export --output models/emotion_classifier.onnx
+    python emotion_classifiers.py quantize models/emotion_classifier.onnx
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+# Label order shared by every classifier's output columns
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+# Position of each label in an emotion vector
+EMOTION_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+
+# Directory holding exported classifier models
+MODEL_DIR = os.getenv('EMOTION_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+
+# FER pulls in TensorFlow, so it is imported on first use rather than at module import
+FER = None
+FER_AVAILABLE = None
+
+try:
+    import onnxruntime
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+EMOTION_CLASSIFIERS = {}
+
+
+def emotions_to_vector(emotions):
+    """
+    Convert a {label: score} dictionary to a float32 vector in EMOTION_LABELS order
+    Unknown labels are ignored and missing ones are 0
+    """
+    vector = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    for label, score in emotions.items():
+        index = EMOTION_INDEX.get(label)
+        if index is not None:
+            vector[index] = score
+    return vector
+
+
+def vector_to_emotions(vector):
+    """
+    Convert an emotion vector to a {label: score} dictionary for JSON output
+    Scores are rounded so float32 noise does not show up in responses
+    """
+    return {label: round(float(score), 4) for label, score in zip(EMOTION_LABELS, vector)}
+
+
+def _load_fer():
+    """Import the FER library once; returns whether it is available"""
+    global FER, FER_AVAILABLE
+    if FER_AVAILABLE is None:
+        try:
+            from fer import FER as fer_class
+            FER = fer_class
+            FER_AVAILABLE = True
+        except ImportError:
+            FER_AVAILABLE = False
+            print("Warning: FER library not available. Using basic emotion detection.")
+    return FER_AVAILABLE
+
+
+def register_emotion_classifier(name):
+    """Class decorator adding an emotion classifier backend to the registry"""
+    def decorator(cls):
+        cls.name = name
+        EMOTION_CLASSIFIERS[name] = cls
+        return cls
+    return decorator
+
+
+def create_emotion_classifier(name=None, required=None, **kwargs):
+    """
+    Build an emotion classifier backend by name
+    Defaults to the EMOTION_CLASSIFIER env var, then 'fer'.
+
+    required: Raise if the backend cannot be built. Defaults to whether a
+        backend was asked for (name or EMOTION_CLASSIFIER). Otherwise the
+        implicit 'fer' default returns None (with a warning) when its runtime
+        is not installed, and detection falls back to basic estimation; any
+        other failure still raises.
+    """
+    requested = name or os.getenv('EMOTION_CLASSIFIER')
+    if required is None:
+        required = bool(requested)
+    name = (requested or 'fer').lower()
+    if name not in EMOTION_CLASSIFIERS:
+        raise ValueError(f"Unknown emotion classifier '{name}', expected one of {sorted(EMOTION_CLASSIFIERS)}")
+    try:
+        classifier = EMOTION_CLASSIFIERS[name](**kwargs)
+    except ImportError as e:
+        if required:
+            raise
+        print(f"Warning: Could not initialize {name} emotion classifier: {e}")
+        return None
+    print(f"{name} emotion classifier initialized successfully")
+    return classifier
+
+
+@register_emotion_classifier('fer')
+class FERClassifier:
+    """FER's Keras mini-XCEPTION model, run through TensorFlow"""
+
+    # TensorFlow's runtime is initialized by loading the model and does not survive fork
+    fork_safe = False
+
+    def __init__(self, mtcnn=False):
+        """
+        Args:
+            mtcnn: Also load FER's MTCNN face detector (legacy pipeline only)
+        """
+        if not _load_fer():
+            raise ImportError('fer is not installed')
+        self.fer = FER(mtcnn=mtcnn)
+        # FER keeps these as self.__emotion_*, which Python mangles to _FER__emotion_*
+        height, width = self.fer._FER__emotion_target_size
+        self.input_size = (int(height), int(width))
+
+    def predict(self, faces):
+        """
+        Classify a (N, H, W) uint8 batch of grayscale faces
+        Returns (N, 7) probabilities in EMOTION_LABELS order
+        """
+        # Same scaling FER applies before its classifier: [0, 255] -> [-1, 1]
+        batch = faces.astype(np.float32)[..., np.newaxis] / 127.5 - 1.0
+        return np.asarray(self.fer._classify_emotions(batch))
+
+
+@register_emotion_classifier('onnx')
+class ONNXClassifier:
+    """
+    FER-style CNN exported to ONNX, run with ONNX Runtime on CPU
+    Accepts NHWC or NCHW single-channel models with a dynamic batch axis
+    """
+
+    # A session created before fork keeps working in the child
+    fork_safe = True
+
+    # Input scalings: FER's [-1, 1], plain [0, 1], or raw [0, 255]
+    SCALINGS = {
+        'fer': lambda x: x / 127.5 - 1.0,
+        'unit': lambda x: x / 255.0,
+        'raw': lambda x: x
+    }
+
+    def __init__(self, model_path=None, quantized=None, scaling=None, threads=None):
+        """
+        Args:
+            model_path: ONNX model. Defaults to EMOTION_ONNX_MODEL, then
+                models/emotion_classifier.onnx (or .int8.onnx when quantized).
+            quantized: Use the int8-quantized model. Defaults to EMOTION_ONNX_QUANTIZED.
+            scaling: Input scaling, one of SCALINGS. Defaults to EMOTION_ONNX_SCALING, then 'fer'.
+            threads: Intra-op threads. Defaults to EMOTION_ONNX_THREADS, then ONNX Runtime's choice.
+        """
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError('onnxruntime is not installed')
+
+        if quantized is None:
+            quantized = os.getenv('EMOTION_ONNX_QUANTIZED', 'false').lower() in ('1', 'true', 'yes')
+        filename = 'emotion_classifier.int8.onnx' if quantized else 'emotion_classifier.onnx'
+        model_path = model_path or os.getenv('EMOTION_ONNX_MODEL') or os.path.join(MODEL_DIR, filename)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        scaling = (scaling or os.getenv('EMOTION_ONNX_SCALING', 'fer')).lower()
+        if scaling not in self.SCALINGS:
+            raise ValueError(f"Unknown scaling '{scaling}', expected one of {sorted(self.SCALINGS)}")
+        self.scale = self.SCALINGS[scaling]
+
+        options = onnxruntime.SessionOptions()
+        threads = threads or int(os.getenv('EMOTION_ONNX_THREADS', '0'))
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = model_input.shape
+        # Single channel in position 1 means NCHW, otherwise NHWC
+        self.channels_first = shape[1] == 1
+        height, width = (shape[2], shape[3]) if self.channels_first else (shape[1], shape[2])
+        self.input_size = (
+            height if isinstance(height, int) else 48,
+            width if isinstance(width, int) else 48
+        )
+
+    def predict(self, faces):
+        """
+        Classify a (N, H, W) uint8 batch of grayscale faces
+        Returns (N, 7) probabilities in EMOTION_LABELS order
+        """
+        batch = self.scale(faces.astype(np.float32))
+        batch = batch[:, np.newaxis] if self.channels_first else batch[..., np.newaxis]
+        scores = self.session.run(None, {self.input_name: batch})[0]
+
+        # Models exported without a final softmax return logits
+        if not np.allclose(scores.sum(axis=1), 1.0, atol=1e-3):
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+
+def export_fer_to_onnx(output, opset=13):
+    """Export FER's Keras emotion model to ONNX with a dynamic batch axis"""
+    import tensorflow as tf
+    import tf2onnx
+
+    if not _load_fer():
+        raise ImportError('fer is not installed')
+    model = FER(mtcnn=False)._FER__emotion_classifier
+    shape = model.input_shape
+    spec = (tf.TensorSpec((None, shape[1], shape[2], shape[3]), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output)
+    print(f"Exported FER emotion model to {output}")
+
+
+def quantize_onnx(model_path, output=None):
+    """Write a dynamically int8-quantized copy of an ONNX model"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output = output or model_path.replace('.onnx', '.int8.onnx')
+    quantize_dynamic(model_path, output, weight_type=QuantType.QInt8)
+    print(f"Quantized {model_path} to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emotion classifier model tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export the FER Keras model to ONNX')
+    export_parser.add_argument('--output', default=os.path.join(MODEL_DIR, 'emotion_classifier.onnx'))
+    export_parser.add_argument('--opset', type=int, default=13)
+
+    quantize_parser = subparsers.add_parser('quantize', help='Create an int8-quantized ONNX model')
+    quantize_parser.add_argument('model')
+    quantize_parser.add_argument('--output')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        export_fer_to_onnx(args.output, args.opset)
+    else:
+        quantize_onnx(args.model, args.output)
+
+
+if __name__ == '__main__':
+    main()
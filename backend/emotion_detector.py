@@ -5,15 +5,340 @@ Detects facial emotions from images using pre-trained models
 
 import cv2
 import numpy as np
-from collections import Counter
+from collections import Counter, OrderedDict, deque
 import os
+import queue
+import threading
+import time
 
-try:
-    from fer import FER
-    FER_AVAILABLE = True
-except ImportError:
-    FER_AVAILABLE = False
-    print("Warning: FER library not available. Using basic emotion detection.")
+from face_detectors import create_face_detector
+from emotion_classifiers import EMOTION_LABELS, create_emotion_classifier, emotions_to_vector, vector_to_emotions
+
+
+class FaceTracker:
+    """
+    Cheap per-session face tracker
+    Follows the last detected face boxes with template matching in a small
+    search window, so the full cascade only has to run every few frames
+    """
+    
+    def __init__(self, redetect_interval=5, min_confidence=0.6, search_margin=0.5):
+        self.redetect_interval = redetect_interval
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.boxes = []
+        self.templates = []
+        self.frame_shape = None
+        self.frames_since_detection = 0
+        self.lock = threading.Lock()
+    
+    def needs_detection(self, gray):
+        """Check whether a full face detection is due for this frame"""
+        return (
+            not self.boxes
+            or gray.shape != self.frame_shape
+            or self.frames_since_detection >= self.redetect_interval
+        )
+    
+    def reset(self, gray, faces):
+        """Start tracking from freshly detected face boxes"""
+        self.boxes = [tuple(int(v) for v in face) for face in faces]
+        self.templates = [gray[y:y+h, x:x+w].copy() for (x, y, w, h) in self.boxes]
+        self.frame_shape = gray.shape
+        self.frames_since_detection = 0
+    
+    def track(self, gray):
+        """
+        Locate the tracked faces in a new frame
+        Returns the updated boxes, or None if any face was lost
+        """
+        img_h, img_w = gray.shape[:2]
+        new_boxes = []
+        new_templates = []
+        
+        for (x, y, w, h), template in zip(self.boxes, self.templates):
+            dx, dy = int(w * self.search_margin), int(h * self.search_margin)
+            x1, y1 = max(x - dx, 0), max(y - dy, 0)
+            x2, y2 = min(x + w + dx, img_w), min(y + h + dy, img_h)
+            window = gray[y1:y2, x1:x2]
+            if window.shape[0] < h or window.shape[1] < w:
+                return None
+            
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, confidence, _, (loc_x, loc_y) = cv2.minMaxLoc(scores)
+            if confidence < self.min_confidence:
+                return None
+            
+            box = (x1 + loc_x, y1 + loc_y, w, h)
+            new_boxes.append(box)
+            new_templates.append(gray[box[1]:box[1]+h, box[0]:box[0]+w].copy())
+        
+        self.boxes = new_boxes
+        self.templates = new_templates
+        self.frames_since_detection += 1
+        return np.array(new_boxes, dtype=np.int32).reshape(-1, 4)
+
+
+class FaceTrackerRegistry:
+    """Per-session face trackers with LRU eviction"""
+    
+    def __init__(self, max_sessions=1024, redetect_interval=5, min_confidence=0.6):
+        self.max_sessions = max_sessions
+        self.redetect_interval = redetect_interval
+        self.min_confidence = min_confidence
+        self.trackers = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, session_id):
+        """Get (or create) the tracker for a session, marking it recently used"""
+        with self.lock:
+            tracker = self.trackers.get(session_id)
+            if tracker is None:
+                tracker = FaceTracker(self.redetect_interval, self.min_confidence)
+                self.trackers[session_id] = tracker
+                if len(self.trackers) > self.max_sessions:
+                    self.trackers.popitem(last=False)
+            else:
+                self.trackers.move_to_end(session_id)
+            return tracker
+    
+    def discard(self, session_id):
+        """Forget the tracker for a session"""
+        with self.lock:
+            self.trackers.pop(session_id, None)
+
+
+DECODE_REDUCTION_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def decode_reduction():
+    """JPEG decode reduction factor from the DECODE_REDUCTION env var (default 1)"""
+    return int(os.getenv('DECODE_REDUCTION', '1'))
+
+
+def decode_frame(buffer, reduction=None):
+    """
+    Decode an encoded image buffer into a BGR array
+    
+    Args:
+        buffer: bytes-like JPEG/PNG data (wrapped without copying)
+        reduction: 1, 2, 4 or 8 - let the JPEG decoder produce a frame that
+            many times smaller. Defaults to the DECODE_REDUCTION env var, then 1.
+            Face locations detected in it are in reduced pixels; map them
+            back with scale_face_locations.
+    """
+    if reduction is None:
+        reduction = decode_reduction()
+    if reduction not in DECODE_REDUCTION_FLAGS:
+        raise ValueError(f"Unsupported decode reduction {reduction}, expected one of {sorted(DECODE_REDUCTION_FLAGS)}")
+    return cv2.imdecode(np.frombuffer(buffer, np.uint8), DECODE_REDUCTION_FLAGS[reduction])
+
+
+def scale_face_locations(result, reduction):
+    """
+    Map a detection result's face locations from a frame decoded with
+    reduction back to the pixels of the uploaded image
+    Returns a new result (cached results are shared between frames)
+    """
+    if not result or reduction == 1 or not result.get('face_locations'):
+        return result
+    return dict(result, face_locations=[
+        {key: value * reduction for key, value in location.items()}
+        for location in result['face_locations']
+    ])
+
+
+def perceptual_hash(gray, hash_size=16):
+    """
+    Difference hash of a grayscale frame
+    Downsamples to (hash_size + 1) x hash_size and records whether each pixel
+    is brighter than its right neighbour, packed into one integer
+    """
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class FrameCache:
+    """
+    Per-session cache of emotion results keyed by perceptual frame hash
+    A frame whose hash is within max_distance bits of a recent frame from the
+    same session reuses that frame's result
+    """
+    
+    def __init__(self, max_sessions=1024, entries_per_session=4, ttl=10.0, max_distance=8):
+        self.max_sessions = max_sessions
+        self.entries_per_session = entries_per_session
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, session_id, frame_hash):
+        """Return the cached result for a near-identical frame, or None"""
+        now = time.monotonic()
+        with self.lock:
+            entries = self.sessions.get(session_id)
+            if entries:
+                self.sessions.move_to_end(session_id)
+                # Drop expired entries (oldest first)
+                while entries and now - entries[0][2] > self.ttl:
+                    entries.popleft()
+                for cached_hash, result, _ in reversed(entries):
+                    if bin(cached_hash ^ frame_hash).count('1') <= self.max_distance:
+                        self.hits += 1
+                        return result
+            self.misses += 1
+            return None
+    
+    def put(self, session_id, frame_hash, result):
+        """Store the result for a frame"""
+        with self.lock:
+            entries = self.sessions.get(session_id)
+            if entries is None:
+                entries = deque(maxlen=self.entries_per_session)
+                self.sessions[session_id] = entries
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session_id)
+            entries.append((frame_hash, result, time.monotonic()))
+    
+    def discard(self, session_id):
+        """Forget cached frames for a session"""
+        with self.lock:
+            self.sessions.pop(session_id, None)
+    
+    def stats(self):
+        """Get hit/miss counters and current size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'sessions': len(self.sessions),
+                'entries': sum(len(entries) for entries in self.sessions.values())
+            }
+
+
+class QualityGate:
+    """
+    Cheap frame quality check run before face detection
+    Rejects dark, blurry or motion-smeared frames and keeps each session's
+    last good result to return in their place
+    """
+    
+    def __init__(self, min_brightness=30.0, min_sharpness=20.0, max_motion=35.0,
+                 max_sessions=1024, analysis_width=160):
+        """
+        Args:
+            min_brightness: Minimum mean luminance (0-255)
+            min_sharpness: Minimum Laplacian variance, measured at analysis_width
+            max_motion: Maximum mean absolute difference to the session's previous frame
+            max_sessions: Sessions to keep state for (LRU)
+            analysis_width: Width the frame is downscaled to before measuring
+        """
+        self.min_brightness = min_brightness
+        self.min_sharpness = min_sharpness
+        self.max_motion = max_motion
+        self.max_sessions = max_sessions
+        self.analysis_width = analysis_width
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.passed = 0
+        self.rejected = Counter()
+    
+    def measure(self, gray, previous=None):
+        """Compute quality metrics on a downscaled copy of the frame"""
+        scale = min(1.0, self.analysis_width / gray.shape[1])
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        metrics = {
+            'brightness': float(small.mean()),
+            'sharpness': float(cv2.Laplacian(small, cv2.CV_32F).var()),
+            'motion': 0.0
+        }
+        if previous is not None and previous.shape == small.shape:
+            metrics['motion'] = float(cv2.absdiff(small, previous).mean())
+        return metrics, small
+    
+    def check(self, gray, session_id=None):
+        """
+        Check a frame
+        Returns (reason, metrics) where reason is None for a good frame or
+        'too_dark', 'blurry' or 'motion' for a rejected one
+        """
+        state = self._state(session_id) if session_id is not None else None
+        metrics, small = self.measure(gray, state['previous'] if state else None)
+        if state is not None:
+            state['previous'] = small
+        
+        reason = None
+        if metrics['brightness'] < self.min_brightness:
+            reason = 'too_dark'
+        elif metrics['sharpness'] < self.min_sharpness:
+            reason = 'blurry'
+        elif metrics['motion'] > self.max_motion:
+            reason = 'motion'
+        
+        with self.lock:
+            if reason:
+                self.rejected[reason] += 1
+            else:
+                self.passed += 1
+        return reason, metrics
+    
+    def remember(self, session_id, result):
+        """Record a session's latest good detection result"""
+        self._state(session_id)['last_good'] = result
+    
+    def last_good(self, session_id):
+        """Get a session's latest good detection result, if any"""
+        if session_id is None:
+            return None
+        with self.lock:
+            state = self.sessions.get(session_id)
+            return state['last_good'] if state else None
+    
+    def _state(self, session_id):
+        """Get (or create) a session's state, marking it recently used"""
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = {'previous': None, 'last_good': None}
+                self.sessions[session_id] = state
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session_id)
+            return state
+    
+    def stats(self):
+        """Get pass/reject counters"""
+        with self.lock:
+            return {
+                'passed': self.passed,
+                'rejected': dict(self.rejected)
+            }
+
+
+# Fallback scores used when no emotion classifier is available
+BASIC_EMOTIONS = emotions_to_vector({
+    'angry': 0.1,
+    'disgust': 0.05,
+    'fear': 0.1,
+    'happy': 0.2,
+    'sad': 0.15,
+    'surprise': 0.1,
+    'neutral': 0.3
+})
 
 
 class EmotionDetector:
@@ -22,120 +347,440 @@ class EmotionDetector:
     Supports multiple emotion detection backends
     """
     
-    def __init__(self):
-        """Initialize emotion detector with face cascade and emotion model"""
-        # Load face detection cascade
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
+    PIPELINES = ('single_pass', 'legacy')
+    
+    def __init__(self, pipeline=None, tracking=None, frame_cache=None, min_face_size=None,
+                 quality_gate=None, face_detector=None, classifier=None):
+        """
+        Initialize emotion detector with face detector and emotion model
         
-        # Initialize FER if available
-        self.fer_detector = None
-        if FER_AVAILABLE:
-            try:
-                self.fer_detector = FER(mtcnn=True)
-                print("FER emotion detector initialized successfully")
-            except Exception as e:
-                print(f"Warning: Could not initialize FER: {e}")
-                self.fer_detector = None
+        Args:
+            pipeline: 'single_pass' detects faces once and classifies the crops
+                directly; 'legacy' re-runs FER/MTCNN detection on each face ROI.
+                Defaults to the EMOTION_PIPELINE env var, then 'single_pass'.
+            tracking: Track faces between frames of the same session instead of
+                running the cascade on every frame. Defaults to the FACE_TRACKING
+                env var, then True.
+            frame_cache: Reuse results for near-identical frames of the same
+                session. Defaults to the FRAME_CACHE env var, then True.
+            min_face_size: Smallest face (in frame pixels) that must be found.
+                Face detection runs on a frame downscaled so such a face just
+                fits the detector's smallest window. Defaults to the FACE_MIN_SIZE
+                env var, then 0 (detect at full resolution).
+            quality_gate: Skip inference on dark, blurry or motion-smeared
+                frames. Defaults to the QUALITY_GATE env var, then True.
+            face_detector: Face detector backend name (see face_detectors.py).
+                Defaults to the FACE_DETECTOR env var, then 'haar'.
+            classifier: Emotion classifier backend name (see emotion_classifiers.py).
+                Defaults to the EMOTION_CLASSIFIER env var, then 'fer'. Only the
+                implicit default may fall back to basic estimation when its
+                runtime is not installed.
+        """
+        self.pipeline = (pipeline or os.getenv('EMOTION_PIPELINE', 'single_pass')).lower()
+        if self.pipeline not in self.PIPELINES:
+            raise ValueError(f"Unknown pipeline '{self.pipeline}', expected one of {self.PIPELINES}")
+        
+        if tracking is None:
+            tracking = os.getenv('FACE_TRACKING', 'true').lower() in ('1', 'true', 'yes')
+        self.face_trackers = None
+        if tracking:
+            self.face_trackers = FaceTrackerRegistry(
+                max_sessions=int(os.getenv('TRACKER_MAX_SESSIONS', '1024')),
+                redetect_interval=int(os.getenv('TRACKER_REDETECT_INTERVAL', '5')),
+                min_confidence=float(os.getenv('TRACKER_MIN_CONFIDENCE', '0.6'))
+            )
+        
+        if frame_cache is None:
+            frame_cache = os.getenv('FRAME_CACHE', 'true').lower() in ('1', 'true', 'yes')
+        self.frame_cache = None
+        if frame_cache:
+            self.frame_cache = FrameCache(
+                max_sessions=int(os.getenv('FRAME_CACHE_MAX_SESSIONS', '1024')),
+                entries_per_session=int(os.getenv('FRAME_CACHE_ENTRIES', '4')),
+                ttl=float(os.getenv('FRAME_CACHE_TTL', '10')),
+                max_distance=int(os.getenv('FRAME_CACHE_MAX_DISTANCE', '8'))
+            )
+        
+        if quality_gate is None:
+            quality_gate = os.getenv('QUALITY_GATE', 'true').lower() in ('1', 'true', 'yes')
+        self.quality_gate = None
+        if quality_gate:
+            self.quality_gate = QualityGate(
+                min_brightness=float(os.getenv('QUALITY_MIN_BRIGHTNESS', '30')),
+                min_sharpness=float(os.getenv('QUALITY_MIN_SHARPNESS', '20')),
+                max_motion=float(os.getenv('QUALITY_MAX_MOTION', '35')),
+                max_sessions=int(os.getenv('TRACKER_MAX_SESSIONS', '1024'))
+            )
+        
+        if min_face_size is None:
+            min_face_size = int(os.getenv('FACE_MIN_SIZE', '0'))
+        self.min_face_size = min_face_size
+        
+        # Load face detector backend
+        self.face_detector = create_face_detector(face_detector)
+        self.face_detector_lock = threading.Lock()
+        
+        # Initialize emotion classifier (None falls back to basic estimation)
+        # A classifier that was asked for explicitly must load, or this raises
+        # MTCNN is only needed when FER has to find faces itself (legacy pipeline)
+        requested = classifier or os.getenv('EMOTION_CLASSIFIER')
+        classifier = (requested or 'fer').lower()
+        if self.pipeline == 'legacy':
+            if classifier != 'fer':
+                raise ValueError("The legacy pipeline requires the 'fer' emotion classifier")
+            self.classifier = create_emotion_classifier('fer', required=bool(requested), mtcnn=True)
+        else:
+            self.classifier = create_emotion_classifier(classifier, required=bool(requested))
+        
+        # The legacy pipeline calls FER's own detect_emotions
+        self.fer_detector = getattr(self.classifier, 'fer', None)
         
         # Emotion labels
-        self.emotion_labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+        self.emotion_labels = EMOTION_LABELS
         
+    @property
+    def fork_safe(self):
+        """Whether the detector can be built in one process and used in a forked child"""
+        return getattr(self.classifier, 'fork_safe', True)
+    
     def detect_faces(self, image):
-        """Detect faces in image using Haar Cascade"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
+        """Detect faces in image using the configured face detector backend"""
+        return self._run_face_detector(image, self._to_gray(image))
+    
+    def _run_face_detector(self, image, gray):
+        """
+        Run the face detector backend on the BGR or grayscale frame it needs
+        Detection runs on a downscaled copy when min_face_size allows it;
+        boxes are mapped back to full-resolution coordinates
+        """
+        if self.face_detector.needs_color:
+            source = image if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        else:
+            source = gray
+        
+        scale = self._detection_scale()
+        if scale < 1.0:
+            source = cv2.resize(source, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        if self.face_detector.thread_safe:
+            faces = self.face_detector.detect(source)
+        else:
+            with self.face_detector_lock:
+                faces = self.face_detector.detect(source)
+        
+        if scale < 1.0 and len(faces) > 0:
+            faces = np.round(faces / scale).astype(np.int32)
         return faces
     
-    def detect_emotions(self, image):
+    def _detection_scale(self):
+        """Downscale factor that keeps min_face_size detectable by the backend"""
+        window = self.face_detector.min_size
+        if window is None or self.min_face_size <= window:
+            return 1.0
+        return window / self.min_face_size
+    
+    def locate_faces(self, image, gray, session_id=None):
+        """
+        Find faces for a session's frame
+        Uses the session's tracker when possible and falls back to a full
+        detection every few frames or when tracking confidence drops
+        """
+        if session_id is None or self.face_trackers is None:
+            return self._run_face_detector(image, gray)
+        
+        tracker = self.face_trackers.get(session_id)
+        with tracker.lock:
+            if not tracker.needs_detection(gray):
+                faces = tracker.track(gray)
+                if faces is not None:
+                    return faces
+            
+            faces = self._run_face_detector(image, gray)
+            tracker.reset(gray, faces)
+            return faces
+    
+    def detect_emotions(self, image, session_id=None):
         """
         Detect emotions in image
         Returns dictionary with emotion predictions and face locations
+        
+        Args:
+            image: BGR image
+            session_id: Optional session the frame belongs to, enables face
+                tracking and near-duplicate frame caching
         """
         try:
-            # Convert BGR to RGB if needed
-            if len(image.shape) == 3 and image.shape[2] == 3:
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            else:
-                rgb_image = image
+            # Cached, rejected or legacy frames come back finished
+            result, pending = self.prepare(image, session_id)
+            if result is not None:
+                return result
             
-            # Detect faces
-            faces = self.detect_faces(image)
-            
-            if len(faces) == 0:
-                return {
-                    'faces_detected': 0,
-                    'dominant_emotion': 'neutral',
-                    'emotions': {'neutral': 1.0},
-                    'confidence': 0.0,
-                    'face_locations': []
-                }
+            # Detect faces once and send the crops straight to the classifier
+            return self.finish(pending, self.classify_faces(pending[1]))
+        
+        except Exception as e:
+            print(f"Emotion detection error: {e}")
+            return self._error_result(e)
+    
+    def prepare(self, image, session_id=None):
+        """
+        Everything before classification: prefilter, then locate and crop faces
+        Returns (result, pending). result is set when the frame needs no
+        classification (cached, rejected, or handled by the legacy pipeline);
+        otherwise pending carries the faces and crops on to finish()
+        """
+        gray = self._to_gray(image)
+        
+        # Cached or rejected frames skip detection entirely
+        result, frame_hash = self._prefilter(gray, session_id)
+        if result is not None:
+            return result, None
+        
+        if self.pipeline == 'legacy':
+            result = self._detect_emotions_legacy(image, gray, session_id)
+            self._remember(session_id, frame_hash, result)
+            return result, None
+        
+        faces = self.locate_faces(image, gray, session_id)
+        return None, (faces, self._extract_face_crops(gray, faces), session_id, frame_hash)
+    
+    def finish(self, pending, predictions):
+        """Build and record the result for a prepared frame from its face predictions"""
+        faces, _, session_id, frame_hash = pending
+        result = self._build_result(faces, predictions)
+        self._remember(session_id, frame_hash, result)
+        return result
+    
+    def _prefilter(self, gray, session_id):
+        """
+        Cheap checks run before detection: frame cache, then quality gate
+        Returns (result, frame_hash); result is set when detection can be
+        skipped, frame_hash is set when a new result should be cached
+        """
+        frame_hash = None
+        if session_id is not None and self.frame_cache is not None:
+            # Near-identical frame from the same session: reuse its result
+            frame_hash = perceptual_hash(gray)
+            cached = self.frame_cache.get(session_id, frame_hash)
+            if cached is not None:
+                return dict(cached, cached=True), None
+        
+        if self.quality_gate is not None:
+            reason, metrics = self.quality_gate.check(gray, session_id)
+            if reason:
+                # Return the session's last good result in place of this frame
+                last_good = self.quality_gate.last_good(session_id) or self._build_result((), [])
+                return dict(last_good, rejected=True, reject_reason=reason, quality=metrics), None
+        
+        return None, frame_hash
+    
+    def _remember(self, session_id, frame_hash, result):
+        """Record a fresh detection result in the frame cache and quality gate"""
+        if frame_hash is not None:
+            self.frame_cache.put(session_id, frame_hash, result)
+        if self.quality_gate is not None and session_id is not None and result.get('faces_detected'):
+            self.quality_gate.remember(session_id, result)
+    
+    def get_stats(self):
+        """Get runtime statistics for the detection path"""
+        return {
+            'pipeline': self.pipeline,
+            'face_detector': self.face_detector.name,
+            'classifier': self.classifier.name if self.classifier else 'basic',
+            'tracked_sessions': len(self.face_trackers.trackers) if self.face_trackers else 0,
+            'frame_cache': self.frame_cache.stats() if self.frame_cache else None,
+            'quality_gate': self.quality_gate.stats() if self.quality_gate else None
+        }
+    
+    def _detect_emotions_legacy(self, image, gray, session_id=None):
+        """
+        Detect emotions by running FER (including its own face detection)
+        on every detected face ROI
+        """
+        # Convert BGR to RGB if needed
+        if len(image.shape) == 3 and image.shape[2] == 3:
+            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        else:
+            rgb_image = image
+        
+        # Detect faces
+        faces = self.locate_faces(image, gray, session_id)
             
-            all_emotions = []
-            face_locations = []
+        all_emotions = []
+        
+        # Process each face
+        for (x, y, w, h) in faces:
+            # Extract face region
+            face_roi = rgb_image[y:y+h, x:x+w]
             
-            # Process each face
-            for (x, y, w, h) in faces:
-                face_locations.append({
-                    'x': int(x),
-                    'y': int(y),
-                    'width': int(w),
-                    'height': int(h)
-                })
-                
-                # Extract face region
-                face_roi = rgb_image[y:y+h, x:x+w]
-                
-                # Use FER if available
-                if self.fer_detector:
-                    try:
-                        emotions = self.fer_detector.detect_emotions(face_roi)
-                        if emotions:
-                            all_emotions.append(emotions[0]['emotions'])
-                    except Exception as e:
-                        print(f"FER detection error: {e}")
-                        # Fallback to basic detection
-                        all_emotions.append(self._basic_emotion_estimation(face_roi))
-                else:
-                    # Basic emotion estimation based on facial features
+            # Use FER if available
+            if self.fer_detector:
+                try:
+                    emotions = self.fer_detector.detect_emotions(face_roi)
+                    if emotions:
+                        all_emotions.append(emotions_to_vector(emotions[0]['emotions']))
+                except Exception as e:
+                    print(f"FER detection error: {e}")
+                    # Fallback to basic detection
                     all_emotions.append(self._basic_emotion_estimation(face_roi))
-            
-            # Aggregate emotions from all faces
-            if all_emotions:
-                aggregated = self._aggregate_emotions(all_emotions)
-                dominant = max(aggregated.items(), key=lambda x: x[1])
-                
-                return {
-                    'faces_detected': len(faces),
-                    'dominant_emotion': dominant[0],
-                    'emotions': aggregated,
-                    'confidence': float(dominant[1]),
-                    'face_locations': face_locations,
-                    'timestamp': self._get_timestamp()
-                }
             else:
-                return {
-                    'faces_detected': len(faces),
-                    'dominant_emotion': 'neutral',
-                    'emotions': {'neutral': 1.0},
-                    'confidence': 0.0,
-                    'face_locations': face_locations
-                }
+                # Basic emotion estimation based on facial features
+                all_emotions.append(self._basic_emotion_estimation(face_roi))
+        
+        return self._build_result(faces, all_emotions)
+    
+    def detect_emotions_batch(self, images, session_ids=None):
+        """
+        Detect emotions in several images at once
+        Faces from every image are classified together in a single forward pass
+        Returns a list of result dictionaries in the same order as images
+        """
+        if session_ids is None:
+            session_ids = [None] * len(images)
+        
+        # Per image: a finished result (cached, rejected or error) or the faces to classify
+        pending = []
+        face_crops = []
+        
+        for image, session_id in zip(images, session_ids):
+            try:
+                result, prepared = self.prepare(image, session_id)
+                if result is not None:
+                    pending.append(result)
+                    continue
+                
+                face_crops.extend(prepared[1])
+                pending.append(prepared)
+            except Exception as e:
+                print(f"Emotion detection error: {e}")
+                pending.append(self._error_result(e))
         
+        try:
+            predictions = self.classify_faces(face_crops)
         except Exception as e:
-            print(f"Emotion detection error: {e}")
+            print(f"Batch classification error: {e}")
+            return [item if isinstance(item, dict) else self._error_result(e) for item in pending]
+        
+        # Split the batch predictions back out per image
+        results = []
+        offset = 0
+        for item in pending:
+            if isinstance(item, dict):
+                results.append(item)
+                continue
+            count = len(item[0])
+            results.append(self.finish(item, predictions[offset:offset + count]))
+            offset += count
+        
+        return results
+    
+    def classify_faces(self, face_crops):
+        """
+        Classify a list of grayscale face crops in one batch
+        Returns an (N, 7) float32 array of emotion vectors in emotion_labels order
+        """
+        if not face_crops:
+            return np.empty((0, len(self.emotion_labels)), dtype=np.float32)
+        
+        if not self.classifier:
+            return np.stack([self._basic_emotion_estimation(crop) for crop in face_crops])
+        
+        height, width = self.classifier.input_size
+        batch = np.empty((len(face_crops), height, width), dtype=np.uint8)
+        for i, crop in enumerate(face_crops):
+            batch[i] = cv2.resize(crop, (width, height))
+        
+        return np.asarray(self.classifier.predict(batch), dtype=np.float32)
+    
+    def _extract_face_crops(self, gray, faces, margin=0.1):
+        """
+        Cut square, slightly padded face crops out of a grayscale image
+        Mirrors the squaring and offsets FER applies to its own detections
+        """
+        img_h, img_w = gray.shape[:2]
+        crops = []
+        for (x, y, w, h) in faces:
+            side = max(w, h)
+            pad = int(side * margin)
+            cx, cy = x + w // 2, y + h // 2
+            half = side // 2 + pad
+            x1, y1 = max(cx - half, 0), max(cy - half, 0)
+            x2, y2 = min(cx + half, img_w), min(cy + half, img_h)
+            crops.append(gray[y1:y2, x1:x2])
+        return crops
+    
+    def _to_gray(self, image):
+        """Convert BGR image to grayscale if needed"""
+        if len(image.shape) == 3 and image.shape[2] == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+    
+    def _build_result(self, faces, all_emotions):
+        """
+        Build detection result from face boxes and per-face emotion vectors
+        Emotions become label dictionaries only here, for JSON output
+        """
+        face_locations = [
+            {
+                'x': int(x),
+                'y': int(y),
+                'width': int(w),
+                'height': int(h)
+            }
+            for (x, y, w, h) in faces
+        ]
+        
+        if len(faces) == 0:
             return {
                 'faces_detected': 0,
                 'dominant_emotion': 'neutral',
                 'emotions': {'neutral': 1.0},
                 'confidence': 0.0,
-                'error': str(e)
+                'face_locations': []
             }
+        
+        # Aggregate emotions from all faces
+        if len(all_emotions):
+            aggregated = self._aggregate_emotions(all_emotions)
+            dominant = int(np.argmax(aggregated))
+            
+            return {
+                'faces_detected': len(faces),
+                'dominant_emotion': self.emotion_labels[dominant],
+                'emotions': vector_to_emotions(aggregated),
+                'confidence': float(aggregated[dominant]),
+                'face_locations': face_locations,
+                'timestamp': self._get_timestamp()
+            }
+        
+        return {
+            'faces_detected': len(faces),
+            'dominant_emotion': 'neutral',
+            'emotions': {'neutral': 1.0},
+            'confidence': 0.0,
+            'face_locations': face_locations
+        }
+    
+    def _error_result(self, error):
+        """Build neutral result for a failed detection"""
+        return {
+            'faces_detected': 0,
+            'dominant_emotion': 'neutral',
+            'emotions': {'neutral': 1.0},
+            'confidence': 0.0,
+            'error': str(error)
+        }
+    
+    def warm_up(self, runs=2):
+        """
+        Run dummy inferences so model graphs are built and buffers allocated
+        before the first real frame arrives
+        """
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        face = np.full((96, 96), 128, dtype=np.uint8)
+        for _ in range(runs):
+            self.detect_faces(frame)
+            self.classify_faces([face])
     
     def _basic_emotion_estimation(self, face_roi):
         """
@@ -144,30 +789,16 @@ class EmotionDetector:
         """
         # This is a simplified fallback - in production, use a trained model
         # For now, return neutral with slight variations
-        emotions = {
-            'angry': 0.1,
-            'disgust': 0.05,
-            'fear': 0.1,
-            'happy': 0.2,
-            'sad': 0.15,
-            'surprise': 0.1,
-            'neutral': 0.3
-        }
-        return emotions
+        return BASIC_EMOTIONS.copy()
     
     def _aggregate_emotions(self, emotion_list):
-        """Aggregate emotions from multiple faces"""
-        aggregated = {emotion: 0.0 for emotion in self.emotion_labels}
-        
-        for emotions in emotion_list:
-            for emotion, value in emotions.items():
-                if emotion in aggregated:
-                    aggregated[emotion] += value
+        """Aggregate emotion vectors from multiple faces into one normalized vector"""
+        aggregated = np.asarray(emotion_list, dtype=np.float32).reshape(-1, len(self.emotion_labels)).sum(axis=0)
         
         # Normalize
-        total = sum(aggregated.values())
+        total = aggregated.sum()
         if total > 0:
-            aggregated = {k: v / total for k, v in aggregated.items()}
+            aggregated /= total
         
         return aggregated
     
@@ -177,8 +808,239 @@ class EmotionDetector:
         return datetime.now().isoformat()
 
 
-if __name__ == '__main__':
-    # Test emotion detector
+def iter_video_frames(path, sample_fps=2.0):
+    """
+    Stream sampled frames from a video file
+    Frames between samples are only grabbed, not decoded, so the cost scales
+    with sample_fps rather than the video's frame rate
+    
+    Yields (offset_seconds, frame) pairs
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video: {path}")
+    
+    interval = 1.0 / sample_fps
+    next_sample = 0.0
+    try:
+        while capture.grab():
+            offset = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if offset + 1e-6 < next_sample:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            # Next point on the sampling grid after this frame
+            next_sample += interval * (1 + int((offset - next_sample) // interval))
+            yield offset, frame
+    finally:
+        capture.release()
+
+
+class VideoTimeline:
+    """
+    Per-second emotion timeline built from sampled frame results
+    Frames arrive in time order; each second is closed and emitted as soon as
+    a frame from a later second arrives
+    """
+    
+    def __init__(self, on_second=None):
+        self.on_second = on_second
+        self.entries = []
+        self.second = None
+        self.frames = 0
+        self.faces = 0
+        self.scores = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+        self.scored_frames = 0
+    
+    def add(self, offset, result):
+        """Fold one frame result into its second"""
+        second = int(offset)
+        if second != self.second:
+            self.flush()
+            self.second = second
+        
+        self.frames += 1
+        # Rejected frames repeat an earlier result and carry no new information
+        if result.get('faces_detected') and not result.get('rejected') and not result.get('error'):
+            self.faces = max(self.faces, result['faces_detected'])
+            self.scores += emotions_to_vector(result['emotions'])
+            self.scored_frames += 1
+    
+    def flush(self):
+        """Close the current second and emit its entry"""
+        if self.second is None:
+            return
+        
+        if self.scored_frames:
+            scores = self.scores / self.scored_frames
+            dominant = int(np.argmax(scores))
+            entry = {
+                'dominant_emotion': EMOTION_LABELS[dominant],
+                'emotions': vector_to_emotions(scores),
+                'confidence': float(scores[dominant]),
+                'faces_detected': self.faces
+            }
+        else:
+            entry = {
+                'dominant_emotion': 'neutral',
+                'emotions': {'neutral': 1.0},
+                'confidence': 0.0,
+                'faces_detected': 0
+            }
+        entry.update(second=self.second, frames=self.frames)
+        
+        self.entries.append(entry)
+        if self.on_second:
+            self.on_second(entry)
+        
+        self.second = None
+        self.frames = 0
+        self.faces = 0
+        self.scores[:] = 0
+        self.scored_frames = 0
+
+
+def analyze_video(detector, path, sample_fps=None, batch_size=None, max_pending=2,
+                  database=None, session_id=None, started_at=None, on_second=None):
+    """
+    Analyze a recorded session video and build a per-second emotion timeline
+    
+    A decode thread streams sampled frames into a bounded queue of batches
+    while the calling thread runs them through detect_emotions_batch, so at
+    most max_pending batches of decoded frames are held in memory.
+    
+    Args:
+        detector: EmotionDetector (or InferencePool / MicroBatchScheduler)
+        path: Video file readable by cv2.VideoCapture
+        sample_fps: Frames analysed per second of video. Defaults to VIDEO_SAMPLE_FPS, then 2.
+        batch_size: Frames per detector batch. Defaults to VIDEO_BATCH_SIZE, then 16.
+        max_pending: Decoded batches allowed to wait for the detector
+        database: Optional Database; each second is logged with log_emotion
+        session_id: Session the timeline is logged to
+        started_at: datetime the recording started; timeline entries are
+            logged at started_at plus their offset. Defaults to now.
+        on_second: Optional callback receiving each timeline entry
+    
+    Returns the list of timeline entries
+    """
+    from datetime import datetime, timedelta
+    
+    sample_fps = sample_fps or float(os.getenv('VIDEO_SAMPLE_FPS', '2'))
+    batch_size = batch_size or int(os.getenv('VIDEO_BATCH_SIZE', '16'))
+    started_at = started_at or datetime.now()
+    # Frames share a tracking/caching session so consecutive frames reuse face boxes
+    tracking_id = f"video:{session_id or path}"
+    
+    def emit(entry):
+        if database is not None and session_id:
+            timestamp = started_at + timedelta(seconds=entry['second'])
+            database.log_emotion(session_id, entry, timestamp=timestamp.isoformat())
+        if on_second:
+            on_second(entry)
+    
+    timeline = VideoTimeline(emit)
+    batches = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    
+    def decode():
+        batch = []
+        try:
+            for offset, frame in iter_video_frames(path, sample_fps):
+                batch.append((offset, frame))
+                if len(batch) == batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch:
+                put(batch)
+            put(None)
+        except Exception as e:
+            put(e)
+    
+    def put(item):
+        # Give up once the consumer has stopped so this thread can exit
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    decoder = threading.Thread(target=decode, name='video-decode', daemon=True)
+    decoder.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            results = detector.detect_emotions_batch(
+                [frame for _, frame in batch],
+                [tracking_id] * len(batch)
+            )
+            for (offset, _), result in zip(batch, results):
+                timeline.add(offset, result)
+        timeline.flush()
+    finally:
+        stop.set()
+        decoder.join()
+    
+    return timeline.entries
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Emotion detection tools')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    analyze_parser = subparsers.add_parser('analyze', help='Analyze a recorded session video')
+    analyze_parser.add_argument('video')
+    analyze_parser.add_argument('--session-id', help='Session to log to (a new one is created if omitted)')
+    analyze_parser.add_argument('--sample-fps', type=float)
+    analyze_parser.add_argument('--batch-size', type=int)
+    analyze_parser.add_argument('--started-at', help='Recording start time (ISO 8601)')
+    analyze_parser.add_argument('--db', help='SQLite database file (default: mental_health.db)')
+    analyze_parser.add_argument('--no-db', action='store_true', help='Print the timeline without logging it')
+    
+    args = parser.parse_args()
+    if args.command != 'analyze':
+        # Test emotion detector
+        detector = EmotionDetector()
+        print("Emotion detector initialized successfully")
+        return
+    
+    from datetime import datetime
+    
+    database = None
+    session_id = args.session_id
+    if not args.no_db:
+        from database import Database
+        database = Database(connection_string=args.db)
+        session_id = session_id or database.create_session()
+    
     detector = EmotionDetector()
-    print("Emotion detector initialized successfully")
+    started = time.monotonic()
+    timeline = analyze_video(
+        detector,
+        args.video,
+        sample_fps=args.sample_fps,
+        batch_size=args.batch_size,
+        database=database,
+        session_id=session_id,
+        started_at=datetime.fromisoformat(args.started_at) if args.started_at else None,
+        on_second=lambda entry: print(
+            f"{entry['second']:>6}s  {entry['dominant_emotion']:<9} "
+            f"{entry['confidence']:.2f}  faces={entry['faces_detected']}  frames={entry['frames']}"
+        )
+    )
+    print(f"Analyzed {len(timeline)}s of video in {time.monotonic() - started:.1f}s"
+          + (f", logged to session {session_id}" if database else ""))
+
+
+if __name__ == '__main__':
+    main()
 
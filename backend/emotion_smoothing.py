@@ -0,0 +1,95 @@
+"""
+Temporal Emotion Smoothing Module
+Keeps a per-session moving average of detected emotions and suggests when
+the client should capture its next frame
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from emotion_classifiers import EMOTION_LABELS, emotions_to_vector, vector_to_emotions
+
+
+class EmotionSmoother:
+    """
+    Per-session exponential moving average and change detector
+    Stable sessions are asked to capture less often; a change in emotional
+    state resets the capture interval to its minimum
+    """
+
+    def __init__(self, alpha=None, change_threshold=None, min_interval_ms=None,
+                 max_interval_ms=None, backoff=None, max_sessions=1024):
+        """
+        Args:
+            alpha: EMA weight of the newest frame. Defaults to SMOOTHING_ALPHA, then 0.3.
+            change_threshold: Total variation distance between a frame and the
+                average that counts as a change. Defaults to CHANGE_THRESHOLD, then 0.25.
+            min_interval_ms: Capture interval after a change. Defaults to CAPTURE_MIN_MS, then 1000.
+            max_interval_ms: Longest capture interval. Defaults to CAPTURE_MAX_MS, then 10000.
+            backoff: Interval multiplier per stable frame. Defaults to CAPTURE_BACKOFF, then 1.5.
+            max_sessions: Sessions to keep state for (LRU)
+        """
+        self.alpha = alpha if alpha is not None else float(os.getenv('SMOOTHING_ALPHA', '0.3'))
+        self.change_threshold = change_threshold if change_threshold is not None else float(os.getenv('CHANGE_THRESHOLD', '0.25'))
+        self.min_interval_ms = min_interval_ms or int(os.getenv('CAPTURE_MIN_MS', '1000'))
+        self.max_interval_ms = max_interval_ms or int(os.getenv('CAPTURE_MAX_MS', '10000'))
+        self.backoff = backoff or float(os.getenv('CAPTURE_BACKOFF', '1.5'))
+        self.default_interval_ms = min(max(2000, self.min_interval_ms), self.max_interval_ms)
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def update(self, session_id, result):
+        """
+        Fold a detection result into the session's average
+        Returns smoothed emotions, whether the state changed, and the
+        suggested delay before the next capture
+        """
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = {'average': None, 'interval_ms': self.default_interval_ms}
+                self.sessions[session_id] = state
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session_id)
+
+            changed = False
+
+            # Rejected frames carry no new information
+            if not result.get('rejected'):
+                emotions = emotions_to_vector(result.get('emotions') or {})
+                average = state['average']
+                if average is None:
+                    state['average'] = emotions
+                    changed = True
+                else:
+                    distance = 0.5 * float(np.abs(emotions - average).sum())
+                    # Plain ints: a numpy bool would not serialize to JSON
+                    changed = (
+                        distance > self.change_threshold
+                        or int(np.argmax(emotions)) != int(np.argmax(average))
+                    )
+                    state['average'] = self.alpha * emotions + (1 - self.alpha) * average
+
+                if changed:
+                    state['interval_ms'] = self.min_interval_ms
+                else:
+                    state['interval_ms'] = min(int(state['interval_ms'] * self.backoff), self.max_interval_ms)
+
+            average = state['average']
+            return {
+                'smoothed_emotions': vector_to_emotions(average) if average is not None else {},
+                'smoothed_dominant_emotion': EMOTION_LABELS[int(np.argmax(average))] if average is not None else None,
+                'emotion_changed': changed,
+                'next_capture_ms': state['interval_ms']
+            }
+
+    def discard(self, session_id):
+        """Forget a session's state"""
+        with self.lock:
+            self.sessions.pop(session_id, None)
@@ -0,0 +1,177 @@
+"""
+Face Detector Backends
+Registry of interchangeable face detectors used by EmotionDetector:
+Haar cascade (default), LBP cascade, OpenCV DNN res10 SSD and YuNet
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Directory holding downloaded model files for the DNN backends
+MODEL_DIR = os.getenv('FACE_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+
+FACE_DETECTORS = {}
+
+
+def register_face_detector(name):
+    """Class decorator adding a face detector backend to the registry"""
+    def decorator(cls):
+        cls.name = name
+        FACE_DETECTORS[name] = cls
+        return cls
+    return decorator
+
+
+def create_face_detector(name=None):
+    """
+    Build a face detector backend by name
+    Defaults to the FACE_DETECTOR env var, then 'haar'
+    """
+    name = (name or os.getenv('FACE_DETECTOR', 'haar')).lower()
+    if name not in FACE_DETECTORS:
+        raise ValueError(f"Unknown face detector '{name}', expected one of {sorted(FACE_DETECTORS)}")
+    return FACE_DETECTORS[name]()
+
+
+def _model_path(env_var, filename):
+    """Resolve a model file from its env var or the model directory"""
+    path = os.getenv(env_var) or os.path.join(MODEL_DIR, filename)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file not found: {path} (set {env_var} or FACE_MODEL_DIR)")
+    return path
+
+
+def _as_boxes(boxes):
+    """Normalize detections to an (N, 4) int32 array of x, y, w, h"""
+    return np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+
+
+@register_face_detector('haar')
+class HaarFaceDetector:
+    """OpenCV Haar cascade (frontal face)"""
+
+    # Smallest face the detector finds reliably; frames may be downscaled to it
+    min_size = 30
+    needs_color = False
+    # detectMultiScale mutates the classifier's evaluator state, so each
+    # thread gets its own CascadeClassifier and threads never share one
+    thread_safe = True
+
+    def __init__(self, cascade_path=None):
+        self.cascade_path = cascade_path or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        self.local = threading.local()
+        # Loaded here too, so a bad path fails at construction
+        self.local.cascade = self._load_cascade()
+
+    def _load_cascade(self):
+        cascade = cv2.CascadeClassifier(self.cascade_path)
+        if cascade.empty():
+            raise FileNotFoundError(f"Could not load cascade: {self.cascade_path}")
+        return cascade
+
+    @property
+    def cascade(self):
+        """This thread's classifier, loaded on its first detection"""
+        cascade = getattr(self.local, 'cascade', None)
+        if cascade is None:
+            cascade = self.local.cascade = self._load_cascade()
+        return cascade
+
+    def detect(self, gray):
+        """Detect faces in a grayscale image"""
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(self.min_size, self.min_size)
+        )
+        return _as_boxes(faces)
+
+
+@register_face_detector('lbp')
+class LBPFaceDetector(HaarFaceDetector):
+    """
+    OpenCV LBP cascade - faster than Haar, somewhat less accurate
+    opencv-python does not bundle LBP cascades; download
+    lbpcascade_frontalface_improved.xml into the model directory
+    """
+
+    min_size = 24
+
+    def __init__(self, cascade_path=None):
+        super().__init__(cascade_path or _model_path('LBP_CASCADE_PATH', 'lbpcascade_frontalface_improved.xml'))
+
+
+@register_face_detector('res10_ssd')
+class Res10SSDFaceDetector:
+    """
+    OpenCV DNN ResNet-10 SSD face detector (Caffe model, 300x300 input)
+    Needs deploy.prototxt and res10_300x300_ssd_iter_140000.caffemodel
+    """
+
+    # The network resizes its input itself; no extra downscaling
+    min_size = None
+    needs_color = True
+    # setInput/forward share the network's buffers
+    thread_safe = False
+    input_size = (300, 300)
+
+    def __init__(self, confidence=None):
+        self.confidence = confidence or float(os.getenv('FACE_DNN_CONFIDENCE', '0.5'))
+        self.net = cv2.dnn.readNetFromCaffe(
+            _model_path('RES10_PROTOTXT_PATH', 'deploy.prototxt'),
+            _model_path('RES10_MODEL_PATH', 'res10_300x300_ssd_iter_140000.caffemodel')
+        )
+
+    def detect(self, image):
+        """Detect faces in a BGR image"""
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(image, self.input_size), 1.0, self.input_size, (104.0, 177.0, 123.0)
+        )
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+
+        detections = detections[detections[:, 2] >= self.confidence]
+        corners = detections[:, 3:7] * np.array([width, height, width, height])
+        corners = np.clip(corners, 0, [width, height, width, height])
+        boxes = np.column_stack([corners[:, :2], corners[:, 2:] - corners[:, :2]])
+        return _as_boxes(boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)])
+
+
+@register_face_detector('yunet')
+class YuNetFaceDetector:
+    """
+    YuNet face detector via cv2.FaceDetectorYN (OpenCV >= 4.5.4)
+    Needs face_detection_yunet_2023mar.onnx from the OpenCV model zoo
+    """
+
+    min_size = 20
+    needs_color = True
+    # The input size is reconfigured per frame
+    thread_safe = False
+
+    def __init__(self, confidence=None):
+        self.detector = cv2.FaceDetectorYN.create(
+            _model_path('YUNET_MODEL_PATH', 'face_detection_yunet_2023mar.onnx'),
+            '',
+            (320, 320),
+            confidence or float(os.getenv('FACE_DNN_CONFIDENCE', '0.6')),
+            0.3,
+            5000
+        )
+        self.input_size = (320, 320)
+
+    def detect(self, image):
+        """Detect faces in a BGR image"""
+        height, width = image.shape[:2]
+        if (width, height) != self.input_size:
+            self.detector.setInputSize((width, height))
+            self.input_size = (width, height)
+        _, faces = self.detector.detect(image)
+        if faces is None:
+            return _as_boxes([])
+        return _as_boxes(np.round(faces[:, :4]))
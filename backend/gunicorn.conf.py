@@ -0,0 +1,52 @@
+"""
+Gunicorn configuration
+Socket.IO keeps each client's session in the worker that accepted it, so the
+/emotion streaming namespace only works with one worker (the default), which
+scales with threads instead. More workers need a load balancer with sticky
+sessions, or clients that do not use streaming.
+
+With more than one worker the emotion detector is preloaded: the master
+loads the model once and forks workers that share its weights copy-on-write;
+each worker then runs its own warm-up. A single worker loads it itself.
+Preloading needs a fork-safe classifier (EMOTION_CLASSIFIER=onnx), since
+TensorFlow (fer) does not survive fork; set PRELOAD_MODELS=false to have
+every worker load its own copy instead.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+    WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py app:app  # no Socket.IO streaming
+"""
+
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+# One worker by default: Socket.IO streaming needs sticky sessions
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '32'))
+
+# Load models synchronously in the master before forking (see app.py); only
+# worth it when there are several workers to share them
+os.environ.setdefault('PRELOAD_MODELS', 'true' if workers > 1 else 'false')
+preload_app = os.environ['PRELOAD_MODELS'].lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    """Log master memory once the preloaded app is ready"""
+    from model_loader import memory_usage
+    server.log.info(f"Master {os.getpid()} memory: {memory_usage()}")
+    if server.cfg.workers > 1:
+        server.log.warning(
+            f"{server.cfg.workers} workers: Socket.IO streaming (/emotion) needs "
+            "sticky sessions in front of gunicorn, or WEB_CONCURRENCY=1"
+        )
+
+
+def post_fork(server, worker):
+    """Warm up the preloaded detector in the new worker and log its memory"""
+    from model_loader import memory_usage
+    server.log.info(f"Worker {worker.pid} forked, memory: {memory_usage()}")
+    if preload_app:
+        from app import warm_up_worker
+        warm_up_worker()
+        server.log.info(f"Worker {worker.pid} warmed up, memory: {memory_usage()}")
@@ -0,0 +1,280 @@
+"""
+Process-pool inference for emotion detection
+Runs EmotionDetector in worker processes so detection scales across cores
+instead of sharing one GIL with the Flask request threads
+"""
+
+import atexit
+import itertools
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _worker_main(conn, shm_name, detector_kwargs):
+    """
+    Worker process loop
+    Loads the detector once, then serves detection requests whose frames
+    are read directly out of the worker's shared memory block
+    """
+    from emotion_detector import EmotionDetector
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    detector = EmotionDetector(**detector_kwargs)
+    detector.warm_up()
+    conn.send(('ready', os.getpid()))
+
+    images = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+
+        command = message[0]
+        if command == 'stop':
+            break
+
+        try:
+            if command == 'detect':
+                _, frames, session_ids = message
+                images = [
+                    np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                    for offset, shape in frames
+                ]
+                if len(images) == 1:
+                    results = [detector.detect_emotions(images[0], session_id=session_ids[0])]
+                else:
+                    results = detector.detect_emotions_batch(images, session_ids)
+                conn.send(('ok', results))
+            elif command == 'stats':
+                conn.send(('ok', detector.get_stats()))
+            else:
+                conn.send(('error', f"Unknown command '{command}'"))
+        except Exception as e:
+            conn.send(('error', str(e)))
+        finally:
+            # Release the views before the buffer can be reused or closed
+            images = None
+
+    shm.close()
+
+
+class InferenceWorker:
+    """One worker process with its own shared memory frame buffer"""
+
+    def __init__(self, context, max_frame_bytes, detector_kwargs):
+        self.context = context
+        self.max_frame_bytes = max_frame_bytes
+        self.detector_kwargs = detector_kwargs
+        self.lock = threading.Lock()
+        self.pid = None
+        self.shm = shared_memory.SharedMemory(create=True, size=max_frame_bytes)
+        self.buffer = np.ndarray((max_frame_bytes,), dtype=np.uint8, buffer=self.shm.buf)
+        self._spawn()
+
+    def _spawn(self):
+        """Start the worker process (does not wait for the model to load)"""
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(child_conn, self.shm.name, self.detector_kwargs),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.pid = None
+
+    def wait_ready(self):
+        """Block until the worker has loaded its detector"""
+        if self.pid is None:
+            _, self.pid = self.conn.recv()
+
+    def detect(self, images, session_ids):
+        """Copy frames into shared memory and run detection in the worker"""
+        with self.lock:
+            frames = []
+            offset = 0
+            for image in images:
+                image = np.ascontiguousarray(image, dtype=np.uint8)
+                if offset + image.nbytes > self.max_frame_bytes:
+                    raise ValueError(f"Frames exceed worker buffer ({self.max_frame_bytes} bytes)")
+                self.buffer[offset:offset + image.nbytes] = image.reshape(-1)
+                frames.append((offset, image.shape))
+                offset += image.nbytes
+
+            return self._request(('detect', frames, list(session_ids)))
+
+    def stats(self):
+        """Get the worker's detector statistics"""
+        with self.lock:
+            return self._request(('stats',))
+
+    def _request(self, message):
+        """Send a request and wait for the reply, restarting a dead worker"""
+        try:
+            self.wait_ready()
+            self.conn.send(message)
+            status, payload = self.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            print(f"Inference worker {self.pid} died: {e}, restarting")
+            self._spawn()
+            raise RuntimeError('Inference worker restarted') from e
+
+        if status != 'ok':
+            raise RuntimeError(payload)
+        return payload
+
+    def close(self):
+        """Stop the worker process and free its shared memory"""
+        try:
+            self.conn.send(('stop',))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.buffer = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferencePool:
+    """
+    Pool of emotion detection worker processes
+    Drop-in replacement for EmotionDetector's detect_emotions,
+    detect_emotions_batch and get_stats. Frames from the same session always
+    go to the same worker so its face tracker and frame cache stay warm.
+    """
+
+    def __init__(self, num_workers=None, max_frame_bytes=None, **detector_kwargs):
+        """
+        Args:
+            num_workers: Worker processes. Defaults to INFERENCE_WORKERS, then CPU count.
+            max_frame_bytes: Shared memory per worker. Defaults to
+                INFERENCE_MAX_FRAME_BYTES, then one 1080p BGR frame.
+            detector_kwargs: Passed to EmotionDetector in each worker
+        """
+        self.num_workers = num_workers or int(os.getenv('INFERENCE_WORKERS', '0')) or os.cpu_count() or 1
+        self.max_frame_bytes = max_frame_bytes or int(os.getenv('INFERENCE_MAX_FRAME_BYTES', str(1920 * 1080 * 3)))
+        self.detector_kwargs = detector_kwargs
+        self.workers = []
+        self.lock = threading.Lock()
+        self.round_robin = itertools.count()
+        self.executor = None
+
+    def start(self):
+        """Start all workers and wait until each has loaded its model"""
+        with self.lock:
+            if self.workers:
+                return
+            # spawn: TensorFlow is not fork-safe once initialized
+            context = multiprocessing.get_context('spawn')
+            workers = [
+                InferenceWorker(context, self.max_frame_bytes, self.detector_kwargs)
+                for _ in range(self.num_workers)
+            ]
+            for worker in workers:
+                worker.wait_ready()
+            self.executor = ThreadPoolExecutor(max_workers=self.num_workers)
+            self.workers = workers
+            atexit.register(self.close)
+            print(f"Inference pool started with {self.num_workers} workers")
+
+    def _worker_for(self, session_id):
+        """Pick a worker: sticky per session, round-robin otherwise"""
+        if session_id is None:
+            index = next(self.round_robin)
+        else:
+            index = zlib.crc32(str(session_id).encode('utf-8'))
+        return self.workers[index % len(self.workers)]
+
+    def detect_emotions(self, image, session_id=None):
+        """Detect emotions in one frame on a worker process"""
+        self.start()
+        try:
+            return self._worker_for(session_id).detect([image], [session_id])[0]
+        except Exception as e:
+            print(f"Inference pool error: {e}")
+            return _error_result(e)
+
+    def detect_emotions_batch(self, images, session_ids=None):
+        """
+        Detect emotions in several frames
+        Frames are grouped per worker, and each group is classified in one pass
+        """
+        self.start()
+        if session_ids is None:
+            session_ids = [None] * len(images)
+
+        groups = {}
+        for index, (image, session_id) in enumerate(zip(images, session_ids)):
+            worker = self._worker_for(session_id)
+            groups.setdefault(worker, []).append(index)
+
+        def run_group(worker, indices):
+            # Split into chunks that fit the worker's shared memory
+            chunk = []
+            chunk_bytes = 0
+            for index in indices + [None]:
+                nbytes = images[index].nbytes if index is not None else 0
+                if chunk and (index is None or chunk_bytes + nbytes > worker.max_frame_bytes):
+                    try:
+                        chunk_results = worker.detect([images[i] for i in chunk], [session_ids[i] for i in chunk])
+                    except Exception as e:
+                        print(f"Inference pool error: {e}")
+                        chunk_results = [_error_result(e) for _ in chunk]
+                    for i, result in zip(chunk, chunk_results):
+                        results[i] = result
+                    chunk = []
+                    chunk_bytes = 0
+                if index is not None:
+                    chunk.append(index)
+                    chunk_bytes += nbytes
+
+        results = [None] * len(images)
+        futures = [self.executor.submit(run_group, worker, indices) for worker, indices in groups.items()]
+        for future in futures:
+            future.result()
+        return results
+
+    def get_stats(self):
+        """Get per-worker detector statistics"""
+        workers = []
+        for worker in self.workers:
+            try:
+                stats = worker.stats()
+            except Exception as e:
+                stats = {'error': str(e)}
+            stats['pid'] = worker.pid
+            workers.append(stats)
+        return {
+            'inference_workers': self.num_workers,
+            'workers': workers
+        }
+
+    def close(self):
+        """Stop all workers"""
+        with self.lock:
+            for worker in self.workers:
+                worker.close()
+            self.workers = []
+            if self.executor:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+
+def _error_result(error):
+    """Neutral result for a failed detection, matching EmotionDetector"""
+    return {
+        'faces_detected': 0,
+        'dominant_emotion': 'neutral',
+        'emotions': {'neutral': 1.0},
+        'confidence': 0.0,
+        'error': str(error)
+    }
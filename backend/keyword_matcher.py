@@ -0,0 +1,106 @@
+"""
+Keyword Matcher Module
+Finds every keyword of several categories in one pass over a message:
+the message is split into words once, single-word keywords are found with a
+set intersection and phrases are only confirmed when all their words occur
+"""
+
+import bisect
+import re
+import string
+from collections import defaultdict
+
+# Punctuation (including common typographic dashes, quotes and ellipses) separates
+# words; translate() + split() tokenizes several times faster than a regex
+SEPARATORS = str.maketrans(dict.fromkeys(
+    string.punctuation + '\u2013\u2014\u2018\u2019\u201c\u201d\u2026', ' '
+))
+
+
+class KeywordMatcher:
+    """
+    Multi-category keyword matcher with whole-word matching
+    Keywords are words or phrases of letters and digits; a phrase's words match
+    across any run of spaces or punctuation ('self harm' matches 'self-harm').
+    A keyword may belong to several categories.
+
+    Keywords of prefix categories match at the start of words instead, so
+    their inflected forms count too ('overdose' matches 'overdosed', 'hurt
+    myself' matches 'hurting myself'). Use them where recall matters more
+    than precision.
+    """
+
+    def __init__(self, categories, prefix_categories=()):
+        """
+        Args:
+            categories: {category: [keyword, ...]}
+            prefix_categories: Categories whose keywords match word prefixes
+        """
+        self.categories = {name: tuple(keywords) for name, keywords in categories.items()}
+        self.keyword_categories = defaultdict(set)
+        for name, keywords in self.categories.items():
+            for keyword in keywords:
+                self.keyword_categories[keyword.lower()].add(name)
+
+        # Keyword -> (its words, pattern matching them adjacent, each as a word prefix)
+        self.prefixes = {
+            keyword.lower(): (
+                tuple(keyword.lower().split()),
+                re.compile(r'\b' + r'\w*\W+'.join(map(re.escape, keyword.lower().split())))
+            )
+            for name in prefix_categories for keyword in self.categories[name]
+        }
+
+        self.words = frozenset(k for k in self.keyword_categories if ' ' not in k and k not in self.prefixes)
+        # Phrase -> (its words, pattern matching them adjacent and whole)
+        self.phrases = {
+            phrase: (
+                frozenset(phrase.split()),
+                re.compile(r'\b' + r'\W+'.join(map(re.escape, phrase.split())) + r'\b')
+            )
+            for phrase in self.keyword_categories if ' ' in phrase and phrase not in self.prefixes
+        }
+
+    def find(self, text):
+        """Return the set of distinct keywords found in text"""
+        text = text.lower()
+        return self.match(text, tokenize(text))
+
+    def match(self, normalized, tokens):
+        """Find keywords in already lowercased text given its tokens"""
+        present = set(tokens)
+        hits = present & self.words
+        for phrase, (words, pattern) in self.phrases.items():
+            if words <= present and pattern.search(normalized):
+                hits.add(phrase)
+        if self.prefixes:
+            # Words starting with a prefix sit together in sorted order
+            ordered = sorted(present)
+            for keyword, (words, pattern) in self.prefixes.items():
+                if all(_has_prefix(ordered, word) for word in words):
+                    if len(words) == 1 or pattern.search(normalized):
+                        hits.add(keyword)
+        return hits
+
+    def count(self, hits):
+        """Count distinct keyword hits per category (every category included)"""
+        counts = dict.fromkeys(self.categories, 0)
+        for keyword in hits:
+            for name in self.keyword_categories[keyword]:
+                counts[name] += 1
+        return counts
+
+    def scan(self, text):
+        """Find keywords in text and count them per category"""
+        return self.count(self.find(text))
+
+
+def _has_prefix(ordered, prefix):
+    """Whether any word of a sorted word list starts with prefix"""
+    i = bisect.bisect_left(ordered, prefix)
+    return i < len(ordered) and ordered[i].startswith(prefix)
+
+
+def tokenize(text):
+    """Split lowercased text into words"""
+    return text.translate(SEPARATORS).split()
@@ -0,0 +1,180 @@
+"""
+Async LLM client
+Runs an AsyncOpenAI client on one event loop in a background thread, so all
+requests share one pool of keep-alive connections instead of each Flask
+worker thread blocking on its own request, and gives every call a deadline:
+callers wait at most that long and can answer some other way when it passes
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+
+import httpx
+from openai import AsyncOpenAI
+
+
+class LLMClient:
+    """
+    Chat completions with pooled connections and a per-call deadline
+    complete() and stream() are called from ordinary threads; the requests
+    themselves run on the client's event loop
+    """
+
+    def __init__(self, api_key, base_url=None, deadline=None, max_connections=None):
+        """
+        Args:
+            api_key: OpenAI API key
+            base_url: API root of an OpenAI-compatible server; the library
+                default (OPENAI_BASE_URL, then api.openai.com) if None
+            deadline: Seconds to wait for a completion, or for each piece of a
+                streamed one. Defaults to LLM_DEADLINE_S, then 8.
+            max_connections: Connection pool size. Defaults to
+                LLM_MAX_CONNECTIONS, then 20.
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.deadline = deadline or float(os.getenv('LLM_DEADLINE_S', '8'))
+        self.max_connections = max_connections or int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+
+        self.lock = threading.Lock()
+        self.pid = None
+        self.loop = None
+        self.client = None
+
+        # Metrics
+        self.calls = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.first_piece_latency = 0.0
+        self.streams = 0
+
+    def _start(self):
+        """
+        Start the event loop thread and create the client on it
+        Threads do not survive fork, so a pre-forked worker starts its own
+        """
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='llm-client', daemon=True).start()
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            # Retries cannot finish inside the deadline; the caller's fallback replaces them
+            max_retries=0,
+            timeout=self.deadline,
+            http_client=httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            ))
+        )
+        # Set last: other threads skip the lock once the pid matches
+        self.pid = os.getpid()
+
+    def _check_process(self):
+        """Start the loop on first use, and again in a forked process"""
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self._start()
+
+    def complete(self, messages, **params):
+        """
+        Get a chat completion's text
+        Raises TimeoutError if it does not arrive within the deadline; the
+        request is cancelled and its connection goes back to the pool
+        """
+        self._check_process()
+        started = time.monotonic()
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self._complete(messages, params), self.deadline), self.loop
+        )
+        try:
+            text = future.result()
+        except asyncio.TimeoutError:
+            self._record(timeouts=1)
+            raise TimeoutError(f"No completion within {self.deadline}s")
+        except Exception:
+            self._record(errors=1)
+            raise
+
+        self._record(completed=1, latency=time.monotonic() - started)
+        return text
+
+    async def _complete(self, messages, params):
+        """Run one chat completion on the loop"""
+        response = await self.client.chat.completions.create(messages=messages, **params)
+        return response.choices[0].message.content or ''
+
+    def stream(self, messages, **params):
+        """
+        Yield a streamed chat completion's text as it arrives
+        Raises TimeoutError if the first piece, or any later one, takes
+        longer than the deadline. Closing the generator cancels the request.
+        """
+        self._check_process()
+        started = time.monotonic()
+        pieces = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._stream(messages, params, pieces), self.loop)
+        first = True
+        try:
+            while True:
+                try:
+                    piece = pieces.get(timeout=self.deadline)
+                except queue.Empty:
+                    self._record(timeouts=1)
+                    raise TimeoutError(f"No streamed response within {self.deadline}s")
+                if isinstance(piece, Exception):
+                    self._record(errors=1)
+                    raise piece
+                if piece is None:
+                    break
+                if first:
+                    first = False
+                    self._record(first_piece_latency=time.monotonic() - started, streams=1)
+                yield piece
+
+            self._record(completed=1, latency=time.monotonic() - started)
+        finally:
+            future.cancel()
+
+    async def _stream(self, messages, params, pieces):
+        """Put each text delta on the pieces queue, then None at the end or the error it failed with"""
+        try:
+            stream = await self.client.chat.completions.create(messages=messages, stream=True, **params)
+            try:
+                async for chunk in stream:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        pieces.put(text)
+            finally:
+                await stream.response.aclose()
+            pieces.put(None)
+        except Exception as e:
+            # Raised by stream() in the caller's thread
+            pieces.put(e)
+
+    def _record(self, **counts):
+        """Add to the metrics; a call is counted once it completed, timed out or failed"""
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+            if counts.keys() & {'completed', 'timeouts', 'errors'}:
+                self.calls += 1
+
+    def stats(self):
+        """Get call outcome counters and mean latencies"""
+        with self.lock:
+            return {
+                'deadline_s': self.deadline,
+                'max_connections': self.max_connections,
+                'calls': self.calls,
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+                'mean_latency_ms': 1000 * self.latency / self.completed if self.completed else 0.0,
+                'mean_first_piece_ms': 1000 * self.first_piece_latency / self.streams if self.streams else 0.0
+            }
@@ -0,0 +1,283 @@
+"""
+Mock OpenAI-compatible LLM server
+Serves the chat.completions API (plain and streamed) with configurable
+latency, token rate and error rate, so the chatbot's LLM path can be load
+and latency tested without network access or an API key. Standard library
+only.
+
+Usage:
+    python mock_llm_server.py --port 8001 --latency lognormal:400:0.5 --tokens-per-second 40
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_TEXT = (
+    "It sounds like you have a lot on your mind right now, and that can feel "
+    "heavy. Thank you for sharing it with me. What feels most important to talk "
+    "about first?"
+)
+
+
+def parse_distribution(spec):
+    """
+    Parse a latency distribution in milliseconds into a sampler
+    fixed:MS, uniform:LOW:HIGH, normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA or
+    exponential:MEAN. Returns a function of a random.Random giving ms >= 0.
+    """
+    name, *params = spec.split(':')
+    try:
+        params = [float(p) for p in params]
+        samplers = {
+            'fixed': (1, lambda rng, ms: ms),
+            'uniform': (2, lambda rng, low, high: rng.uniform(low, high)),
+            'normal': (2, lambda rng, mean, stddev: rng.gauss(mean, stddev)),
+            'lognormal': (2, lambda rng, median, sigma: median * rng.lognormvariate(0, sigma)),
+            'exponential': (1, lambda rng, mean: rng.expovariate(1 / mean) if mean else 0.0)
+        }
+        arity, sample = samplers[name]
+    except (KeyError, ValueError):
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    if len(params) != arity:
+        raise ValueError(f"{name} takes {arity} parameter(s): {spec}")
+    return lambda rng: max(0.0, sample(rng, *params))
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    """Thread per connection, with room for a burst of concurrent connects"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class MockLLMServer:
+    """
+    Threaded chat.completions server
+    latency is the time to the first token; later tokens follow at
+    tokens_per_second. A request fails with error_status at error_rate.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency='fixed:0', tokens_per_second=0,
+                 response_tokens=None, error_rate=0.0, error_status=500, seed=None):
+        """
+        Args:
+            host, port: Address to listen on (port 0 picks a free port)
+            latency: Time-to-first-token distribution, see parse_distribution
+            tokens_per_second: Token rate after the first, 0 for no delay
+            response_tokens: Tokens per response; the request's max_tokens
+                (or 50) if None
+            error_rate: Fraction of requests answered with error_status
+            error_status: HTTP status of failed requests (500, 429, 503, ...)
+            seed: Random seed for reproducible latencies and errors
+        """
+        self.latency = parse_distribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'streamed': 0, 'errors': 0, 'disconnected': 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self.httpd = MockHTTPServer((host, port), MockLLMHandler)
+        self.httpd.mock = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        """API root to give the OpenAI client"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serve in a background thread; returns the base URL"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='mock-llm', daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def plan(self, max_tokens):
+        """Draw one request's outcome: (error?, first token delay s, token interval s, tokens)"""
+        with self.lock:
+            failed = self.rng.random() < self.error_rate
+            delay = self.latency(self.rng) / 1000
+        tokens = self.response_tokens or max_tokens or 50
+        interval = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+        return failed, delay, interval, tokens
+
+    def count(self, name, in_flight=0):
+        """Add to a counter and track concurrent requests"""
+        with self.lock:
+            if name:
+                self.counts[name] += 1
+            self.in_flight += in_flight
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def stats(self):
+        """Get request counters"""
+        with self.lock:
+            return dict(self.counts, in_flight=self.in_flight, max_in_flight=self.max_in_flight)
+
+
+def response_pieces(tokens):
+    """The response text split into tokens (one word each, cycling the canned text)"""
+    words = RESPONSE_TEXT.split()
+    return [('' if i == 0 else ' ') + words[i % len(words)] for i in range(tokens)]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Request handler; HTTP/1.1 so clients can keep connections alive"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path.endswith('/models'):
+            self.send_json(200, {'object': 'list', 'data': [{'id': 'gpt-3.5-turbo', 'object': 'model'}]})
+        elif self.path == '/mock/stats':
+            self.send_json(200, mock.stats())
+        else:
+            self.send_error_json(404, f"Unknown path: {self.path}")
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_error_json(400, 'Request body is not valid JSON')
+            return
+        if not self.path.endswith('/chat/completions'):
+            self.send_error_json(404, f"Unknown path: {self.path}")
+            return
+
+        mock.count('requests', in_flight=1)
+        try:
+            failed, delay, interval, tokens = mock.plan(body.get('max_tokens'))
+            time.sleep(delay)
+            if failed:
+                mock.count('errors')
+                self.send_error_json(mock.error_status, 'Mock server error')
+            elif body.get('stream'):
+                mock.count('streamed')
+                self.stream_completion(body, tokens, interval)
+            else:
+                time.sleep(interval * (tokens - 1))
+                self.send_completion(body, tokens)
+        except (BrokenPipeError, ConnectionResetError):
+            mock.count('disconnected')
+            self.close_connection = True
+        finally:
+            mock.count(None, in_flight=-1)
+
+    def send_completion(self, body, tokens):
+        """Answer with the whole completion at once"""
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+        self.send_json(200, {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-3.5-turbo'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(response_pieces(tokens))},
+                'finish_reason': 'length' if tokens == body.get('max_tokens') else 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': tokens,
+                'total_tokens': prompt_tokens + tokens
+            }
+        })
+
+    def stream_completion(self, body, tokens, interval):
+        """Answer with server-sent chunks, one token per chunk, over chunked transfer encoding"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get('model', 'gpt-3.5-turbo')
+
+        def send_chunk(delta, finish_reason=None):
+            self.write_chunk('data: ' + json.dumps({
+                'id': chunk_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }) + '\n\n')
+
+        send_chunk({'role': 'assistant', 'content': ''})
+        for i, piece in enumerate(response_pieces(tokens)):
+            if i:
+                time.sleep(interval)
+            send_chunk({'content': piece})
+        send_chunk({}, 'length' if tokens == body.get('max_tokens') else 'stop')
+        self.write_chunk('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message):
+        """Error body in the shape the OpenAI API uses"""
+        self.send_json(status, {'error': {'message': message, 'type': 'server_error', 'code': None}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible chat.completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', default='fixed:0',
+                        help='Time to first token in ms: fixed:MS, uniform:LOW:HIGH, normal:MEAN:STDDEV, '
+                             'lognormal:MEDIAN:SIGMA or exponential:MEAN')
+    parser.add_argument('--tokens-per-second', type=float, default=0, help='Token rate after the first (0 = instant)')
+    parser.add_argument('--tokens', type=int, default=None, help="Tokens per response (default: the request's max_tokens)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of failed requests')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.tokens_per_second, args.tokens,
+                           args.error_rate, args.error_status, args.seed)
+    print(f"Mock LLM server on {server.base_url} (stats at /mock/stats)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Background Model Loading Module
+Builds slow-to-load components (the emotion detector) off the request path
+so the rest of the backend can serve immediately after startup
+"""
+
+import gc
+import threading
+import time
+
+
+class BackgroundLoader:
+    """
+    Builds a component on a background thread
+    State goes 'pending' -> 'warming' -> 'ready' (or 'failed')
+    """
+
+    def __init__(self, name, factory):
+        """
+        Args:
+            name: Component name used in logs and health output
+            factory: Callable that builds and warms up the component
+        """
+        self.name = name
+        self.factory = factory
+        self.state = 'pending'
+        self.instance = None
+        self.error = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+        self.loaded = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start loading in the background (no-op if already started)"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.state = 'warming'
+            self.thread = threading.Thread(target=self._load, name=f"{self.name}-loader", daemon=True)
+            self.thread.start()
+
+    def _load(self):
+        """Build the component and record the outcome"""
+        started = time.monotonic()
+        try:
+            self.instance = self.factory()
+            self.state = 'ready'
+            print(f"{self.name} ready after {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            self.state = 'failed'
+            print(f"Error: could not load {self.name}: {e}")
+        finally:
+            self.load_seconds = time.monotonic() - started
+            self.loaded.set()
+
+    @property
+    def ready(self):
+        """Whether the component can be used"""
+        return self.state == 'ready'
+
+    def wait(self, timeout=None):
+        """Block until loading finished; returns the instance or None"""
+        self.loaded.wait(timeout)
+        return self.instance
+
+    def status(self):
+        """Loading state for health reporting"""
+        status = {'state': self.state}
+        if self.load_seconds is not None:
+            status['load_seconds'] = round(self.load_seconds, 3)
+        if self.error:
+            status['error'] = self.error
+        return status
+
+
+def preload(loader):
+    """
+    Load a component synchronously before the server forks its workers
+    Freezes the garbage collector afterwards so collections in the workers do
+    not write to the preloaded objects and their pages stay shared
+    copy-on-write
+    """
+    loader.start()
+    loader.wait()
+    if not loader.ready:
+        raise RuntimeError(f"Could not preload {loader.name}: {loader.error}")
+    gc.freeze()
+    print(f"Preloaded {loader.name}, memory: {memory_usage()}")
+
+
+def memory_usage():
+    """
+    Resident, proportional, shared and private memory of this process in MB
+    Read from /proc/self/smaps_rollup; returns None where that is unavailable
+    """
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'):
+                    fields[key] = int(rest.split()[0]) / 1024
+    except (OSError, ValueError):
+        return None
+
+    return {
+        'rss_mb': round(fields.get('Rss', 0.0), 1),
+        'pss_mb': round(fields.get('Pss', 0.0), 1),
+        'shared_mb': round(fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0), 1),
+        'private_mb': round(fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0), 1)
+    }
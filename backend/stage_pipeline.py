@@ -0,0 +1,256 @@
+"""
+Stage-pipelined emotion detection
+Splits detection into decode, face detect and classify stages, each with
+its own thread pool and a bounded input queue, so frames from concurrent
+requests overlap across stages. OpenCV and the classifier runtimes release
+the GIL while they work, so the stages run in parallel on multi-core hosts.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from emotion_detector import decode_frame, decode_reduction, scale_face_locations
+
+
+class FrameSkipped(Exception):
+    """Raised to the caller when a frame's skip check dropped it before detection"""
+
+    def __init__(self, reason):
+        super().__init__(f"Frame skipped: {reason}")
+        self.reason = reason
+
+
+class Stage:
+    """One pipeline stage: a bounded input queue served by a pool of threads"""
+
+    def __init__(self, name, handler, workers, queue_size, max_items=1):
+        """
+        Args:
+            name: Stage name used in thread names and stats
+            handler: Callable receiving a list of up to max_items jobs
+            workers: Threads serving the queue
+            queue_size: Jobs allowed to wait; put() blocks beyond that
+            max_items: Jobs a thread takes from the queue at once
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_items = max_items
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        # Metrics
+        self.lock = threading.Lock()
+        self.max_queue_depth = 0
+        self.calls = 0
+        self.processed = 0
+        self.service_time = 0.0
+        self.wait_time = 0.0
+
+        self.threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, job):
+        """Queue a job, blocking while the queue is full"""
+        job.queued_at = time.monotonic()
+        self.queue.put(job)
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            with self.lock:
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def _run(self):
+        """Take jobs off the queue and run the handler on them"""
+        while True:
+            jobs = [self.queue.get()]
+            while len(jobs) < self.max_items:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            started = time.monotonic()
+            # Measured before the handler, which re-queues jobs for the next stage
+            waited = sum(started - job.queued_at for job in jobs)
+            try:
+                self.handler(jobs)
+            except Exception as e:
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+            finished = time.monotonic()
+
+            with self.lock:
+                self.calls += 1
+                self.processed += len(jobs)
+                self.service_time += finished - started
+                self.wait_time += waited
+
+    def stats(self):
+        """Queue depth and per-job service time"""
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'processed': self.processed,
+                'mean_batch_size': self.processed / self.calls if self.calls else 0.0,
+                'mean_service_ms': 1000 * self.service_time / self.processed if self.processed else 0.0,
+                'mean_queue_wait_ms': 1000 * self.wait_time / self.processed if self.processed else 0.0
+            }
+
+
+class Job:
+    """A frame moving through the pipeline"""
+
+    __slots__ = ('buffer', 'image', 'session_id', 'skip', 'pending', 'future', 'queued_at')
+
+    def __init__(self, buffer=None, image=None, session_id=None, skip=None):
+        self.buffer = buffer
+        self.image = image
+        self.session_id = session_id
+        self.skip = skip
+        self.pending = None
+        self.future = Future()
+        self.queued_at = None
+
+
+class StagePipeline:
+    """
+    Pipelined front end for EmotionDetector
+    detect_encoded() enters at the decode stage, detect_emotions() with an
+    already decoded frame enters at the face detect stage. The classify stage
+    classifies the faces of every frame waiting in its queue in one batch.
+    """
+
+    def __init__(self, detector, decode_workers=None, detect_workers=None,
+                 classify_workers=None, queue_size=None, classify_batch=None):
+        """
+        Args:
+            detector: EmotionDetector
+            decode_workers: Defaults to PIPELINE_DECODE_WORKERS, then 2.
+            detect_workers: Defaults to PIPELINE_DETECT_WORKERS, then the CPU count.
+            classify_workers: Defaults to PIPELINE_CLASSIFY_WORKERS, then 1.
+            queue_size: Per-stage queue bound. Defaults to PIPELINE_QUEUE_SIZE, then 32.
+            classify_batch: Most frames classified together. Defaults to
+                PIPELINE_CLASSIFY_BATCH, then 16.
+        """
+        self.detector = detector
+        self.decode_workers = decode_workers or int(os.getenv('PIPELINE_DECODE_WORKERS', '2'))
+        self.detect_workers = detect_workers or int(os.getenv('PIPELINE_DETECT_WORKERS', str(os.cpu_count() or 2)))
+        self.classify_workers = classify_workers or int(os.getenv('PIPELINE_CLASSIFY_WORKERS', '1'))
+        self.queue_size = queue_size or int(os.getenv('PIPELINE_QUEUE_SIZE', '32'))
+        self.classify_batch = classify_batch or int(os.getenv('PIPELINE_CLASSIFY_BATCH', '16'))
+        self.reduction = decode_reduction()
+
+        self.lock = threading.Lock()
+        self.pid = None
+        self._start_stages()
+
+    def _start_stages(self):
+        """
+        Create the stages and their threads for this process
+        Threads do not survive fork, so a pre-forked worker starts its own
+        """
+        self.pid = os.getpid()
+        # Created in reverse so each stage can hand on to the next
+        self.classify_stage = Stage('classify', self._classify, self.classify_workers,
+                                    self.queue_size, max_items=self.classify_batch)
+        self.detect_stage = Stage('detect', self._detect, self.detect_workers, self.queue_size)
+        self.decode_stage = Stage('decode', self._decode, self.decode_workers, self.queue_size)
+        self.stages = (self.decode_stage, self.detect_stage, self.classify_stage)
+
+    def _check_process(self):
+        """Restart the stages if this process was forked after they started"""
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self._start_stages()
+
+    def detect_encoded(self, buffer, session_id=None, skip=None):
+        """
+        Decode and detect an encoded (JPEG/PNG) frame
+        Returns the result, or None if the buffer is not a valid image. Face
+        locations are in the buffer's pixels even with DECODE_REDUCTION.
+
+        skip: Optional callable checked when the frame reaches face detection;
+            if it returns a reason, FrameSkipped is raised instead of detecting
+        """
+        self._check_process()
+        job = Job(buffer=buffer, session_id=session_id, skip=skip)
+        self.decode_stage.put(job)
+        return scale_face_locations(job.future.result(), self.reduction)
+
+    def detect_emotions(self, image, session_id=None, skip=None):
+        """Detect emotions in a decoded frame (skip as for detect_encoded)"""
+        self._check_process()
+        job = Job(image=image, session_id=session_id, skip=skip)
+        self.detect_stage.put(job)
+        return job.future.result()
+
+    def detect_emotions_batch(self, images, session_ids=None):
+        """Already-batched requests go straight to the detector"""
+        return self.detector.detect_emotions_batch(images, session_ids)
+
+    def backlog(self):
+        """Frames currently queued across all stages"""
+        return sum(stage.queue.qsize() for stage in self.stages)
+
+    def _decode(self, jobs):
+        """Decode stage: encoded buffer -> BGR frame"""
+        for job in jobs:
+            job.image = decode_frame(job.buffer, self.reduction)
+            job.buffer = None
+            if job.image is None:
+                job.future.set_result(None)
+            else:
+                self.detect_stage.put(job)
+
+    def _detect(self, jobs):
+        """Face detect stage: prefilter, locate and crop faces"""
+        for job in jobs:
+            # Frames can go stale while queued; check once more before the expensive part
+            reason = job.skip() if job.skip else None
+            if reason:
+                job.image = None
+                job.future.set_exception(FrameSkipped(reason))
+                continue
+            try:
+                result, job.pending = self.detector.prepare(job.image, job.session_id)
+            except Exception as e:
+                print(f"Emotion detection error: {e}")
+                result = self.detector._error_result(e)
+            job.image = None
+            if result is not None:
+                job.future.set_result(result)
+            else:
+                self.classify_stage.put(job)
+
+    def _classify(self, jobs):
+        """Classify stage: one forward pass over the faces of every frame taken from the queue"""
+        face_crops = [crop for job in jobs for crop in job.pending[1]]
+        try:
+            predictions = self.detector.classify_faces(face_crops)
+        except Exception as e:
+            print(f"Batch classification error: {e}")
+            for job in jobs:
+                job.future.set_result(self.detector._error_result(e))
+            return
+
+        offset = 0
+        for job in jobs:
+            count = len(job.pending[0])
+            job.future.set_result(self.detector.finish(job.pending, predictions[offset:offset + count]))
+            offset += count
+
+    def get_stats(self):
+        """Get detector statistics plus per-stage queue depth and service time"""
+        stats = self.detector.get_stats()
+        stats['stages'] = {stage.name: stage.stats() for stage in self.stages}
+        return stats
@@ -0,0 +1,63 @@
+"""
+Tests for emotion detection admission control
+"""
+
+import time
+
+from admission_control import AdmissionController, FrameSequencer
+
+
+def test_frames_beyond_backlog_are_shed():
+    """Frames are refused while max_backlog are in flight and admitted again after a release"""
+    admission = AdmissionController(max_backlog=2)
+    assert admission.admit()
+    assert admission.admit()
+    assert not admission.admit()
+
+    admission.release()
+    assert admission.admit()
+
+    stats = admission.stats()
+    assert stats['admitted'] == 3
+    assert stats['shed'] == 1
+    assert stats['in_flight'] == 2
+
+
+def test_zero_backlog_disables_shedding():
+    """max_backlog=0 admits everything"""
+    admission = AdmissionController(max_backlog=0)
+    assert all(admission.admit() for _ in range(100))
+
+
+def test_last_result_is_kept_per_session():
+    """The latest result is kept per session, least recently used evicted first"""
+    admission = AdmissionController(max_sessions=2)
+    admission.remember('a', {'dominant_emotion': 'sad'})
+    admission.remember('b', {'dominant_emotion': 'happy'})
+    admission.remember('a', {'dominant_emotion': 'neutral'})
+    admission.remember('c', {'dominant_emotion': 'fear'})
+
+    assert admission.last_result('a') == {'dominant_emotion': 'neutral'}
+    assert admission.last_result('b') is None
+    assert admission.last_result(None) is None
+
+
+def test_older_sequence_is_superseded():
+    """A frame is dropped once a newer frame of its session has arrived"""
+    sequencer = FrameSequencer(max_age_ms=0)
+    assert sequencer.arrive('s1', sequence=1) is None
+    assert sequencer.arrive('s1', sequence=3) is None
+    assert sequencer.arrive('s1', sequence=2) == 'superseded'
+    assert sequencer.check('s1', sequence=1) == 'superseded'
+    assert sequencer.arrive('s2', sequence=1) is None
+
+
+def test_age_ignores_client_clock_skew():
+    """Ages are relative to the session's fastest frame, not the server clock"""
+    sequencer = FrameSequencer(max_age_ms=1000)
+    # Client clock an hour behind the server
+    now = time.time() * 1000 - 3600 * 1000
+    assert sequencer.arrive('s1', sequence=1, captured_at=now) is None
+    assert sequencer.arrive('s1', sequence=2, captured_at=now + 500) is None
+    assert sequencer.arrive('s1', sequence=3, captured_at=now - 5000) == 'expired'
+    assert sequencer.stats()['dropped'] == {'expired': 1}
@@ -0,0 +1,123 @@
+"""
+Tests for the micro-batching scheduler
+Uses a stub detector so no vision libraries are needed
+"""
+
+import threading
+import time
+
+from batch_scheduler import MicroBatchScheduler
+
+
+class StubDetector:
+    """Records the batches it receives and echoes each frame back"""
+
+    def __init__(self):
+        self.batches = []
+
+    def detect_emotions_batch(self, images, session_ids=None):
+        self.batches.append(list(images))
+        time.sleep(0.01)
+        return [{'frame': image, 'session_id': session_id} for image, session_id in zip(images, session_ids)]
+
+    def get_stats(self):
+        return {}
+
+
+class StagedStubDetector(StubDetector):
+    """Splits detection like EmotionDetector: prepare, classify_faces, finish"""
+
+    def __init__(self):
+        super().__init__()
+        self.prepare_threads = set()
+
+    def prepare(self, image, session_id=None):
+        self.prepare_threads.add(threading.get_ident())
+        if image is None:
+            return {'cached': True}, None
+        return None, ([(0, 0, 1, 1)], [image], session_id, None)
+
+    def classify_faces(self, face_crops):
+        self.batches.append(list(face_crops))
+        time.sleep(0.01)
+        return [[crop] for crop in face_crops]
+
+    def finish(self, pending, predictions):
+        return {'frame': predictions[0][0], 'session_id': pending[2]}
+
+    def _error_result(self, error):
+        return {'error': str(error)}
+
+
+def test_concurrent_requests_are_batched():
+    """Concurrent callers share batches and each gets its own result back"""
+    detector = StubDetector()
+    scheduler = MicroBatchScheduler(detector, max_batch=8, max_wait_ms=50)
+    results = {}
+
+    def call(i):
+        results[i] = scheduler.detect_emotions(i, session_id=f"session-{i}")
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[i] == {'frame': i, 'session_id': f"session-{i}"} for i in range(8))
+    assert len(detector.batches) < 8
+    assert max(len(batch) for batch in detector.batches) <= 8
+
+    stats = scheduler.get_stats()['scheduler']
+    assert stats['frames'] == 8
+    assert stats['batches'] == len(detector.batches)
+
+
+def test_detector_errors_reach_every_caller():
+    """A failing batch raises in each waiting caller"""
+
+    class FailingDetector(StubDetector):
+        def detect_emotions_batch(self, images, session_ids=None):
+            raise RuntimeError('boom')
+
+    scheduler = MicroBatchScheduler(FailingDetector(), max_batch=4, max_wait_ms=1)
+    try:
+        scheduler.detect_emotions('frame')
+    except RuntimeError as e:
+        assert str(e) == 'boom'
+    else:
+        raise AssertionError('Expected RuntimeError')
+
+
+def test_frames_are_prepared_in_the_callers_threads():
+    """Only face classification is batched; detection runs in each caller's thread"""
+    detector = StagedStubDetector()
+    scheduler = MicroBatchScheduler(detector, max_batch=8, max_wait_ms=50)
+    results = {}
+    callers = set()
+
+    def call(i):
+        callers.add(threading.get_ident())
+        results[i] = scheduler.detect_emotions(i, session_id=f"session-{i}")
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[i] == {'frame': i, 'session_id': f"session-{i}"} for i in range(8))
+    assert detector.prepare_threads == callers
+    assert len(detector.batches) < 8
+
+
+def test_prepared_results_skip_the_queue():
+    """A frame finished by prepare (cached or rejected) is returned without batching"""
+    detector = StagedStubDetector()
+    scheduler = MicroBatchScheduler(detector, max_batch=4, max_wait_ms=1000)
+
+    started = time.monotonic()
+    assert scheduler.detect_emotions(None) == {'cached': True}
+    assert time.monotonic() - started < 0.5
+    assert detector.batches == []
+    assert scheduler.get_stats()['scheduler']['frames'] == 0
@@ -0,0 +1,40 @@
+"""
+Tests for streaming chatbot responses
+"""
+
+from chatbot import TherapeuticChatbot
+
+
+class FakeLLMClient:
+    """Stands in for LLMClient, streaming the given pieces"""
+
+    def __init__(self, pieces, fail_after=None):
+        self.pieces = pieces
+        self.fail_after = fail_after
+
+    def stream(self, messages, **params):
+        for i, piece in enumerate(self.pieces):
+            if i == self.fail_after:
+                raise TimeoutError('No streamed response')
+            yield piece
+
+
+def chatbot_with(llm_client):
+    chatbot = TherapeuticChatbot()
+    chatbot.llm_client = llm_client
+    return chatbot
+
+
+def test_stream_yields_pieces_as_they_arrive():
+    """Pieces are forwarded as generated, without the leading whitespace"""
+    chatbot = chatbot_with(FakeLLMClient(['\n', ' I hear', ' you.']))
+    assert list(chatbot.stream_response('I feel sad')) == ['I hear', ' you.']
+
+
+def test_stream_falls_back_before_first_piece_only():
+    """An upstream failure before any output yields the rule-based response instead"""
+    pieces = list(chatbot_with(FakeLLMClient(['Hi'], fail_after=0)).stream_response('I feel sad'))
+    assert len(pieces) == 1 and pieces[0]
+
+    pieces = list(chatbot_with(FakeLLMClient(['I hear', ' you'], fail_after=1)).stream_response('I feel sad'))
+    assert pieces == ['I hear']
@@ -0,0 +1,81 @@
+"""
+Tests for the emotion classifier backends, with a stand-in for the fer package
+"""
+
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import emotion_classifiers
+from emotion_classifiers import EMOTION_LABELS, create_emotion_classifier
+
+
+class StubKerasModel:
+    input_shape = (None, 64, 64, 1)
+
+    def __call__(self, faces):
+        # Every face is 'happy'
+        scores = np.zeros((len(faces), len(EMOTION_LABELS)), dtype=np.float32)
+        scores[:, EMOTION_LABELS.index('happy')] = 1.0
+        return scores
+
+
+class FER:
+    """Stand-in for fer.FER; same class name, so the same mangled private names as fer 22.5.0"""
+
+    def __init__(self, mtcnn=False):
+        self.__emotion_classifier = StubKerasModel()
+        self.__emotion_target_size = self.__emotion_classifier.input_shape[1:3]
+
+    def _classify_emotions(self, gray_faces):
+        return self.__emotion_classifier(gray_faces)
+
+
+@pytest.fixture
+def stub_fer(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'fer', types.SimpleNamespace(FER=FER))
+    monkeypatch.setattr(emotion_classifiers, 'FER', None)
+    monkeypatch.setattr(emotion_classifiers, 'FER_AVAILABLE', None)
+
+
+def test_fer_classifier_uses_private_model(stub_fer):
+    """The FER backend reads the name-mangled input size and classifies a batch"""
+    classifier = create_emotion_classifier('fer')
+    assert classifier.input_size == (64, 64)
+    scores = classifier.predict(np.zeros((3, 64, 64), dtype=np.uint8))
+    assert scores.shape == (3, 7)
+    assert (scores.argmax(axis=1) == EMOTION_LABELS.index('happy')).all()
+
+
+def test_requested_classifier_fails_loudly(monkeypatch):
+    """Only the implicit default may fall back when its runtime is missing"""
+    monkeypatch.delenv('EMOTION_CLASSIFIER', raising=False)
+    monkeypatch.setattr(emotion_classifiers, 'FER_AVAILABLE', False)
+    assert create_emotion_classifier() is None
+    with pytest.raises(ImportError):
+        create_emotion_classifier('fer')
+
+    monkeypatch.setenv('EMOTION_CLASSIFIER', 'fer')
+    with pytest.raises(ImportError):
+        create_emotion_classifier()
+
+
+def test_broken_fer_is_not_silently_ignored(stub_fer, monkeypatch):
+    """A fer install that cannot be built raises even for the implicit default"""
+    monkeypatch.delenv('EMOTION_CLASSIFIER', raising=False)
+    monkeypatch.setattr(FER, '__init__', lambda self, mtcnn=False: None)
+    with pytest.raises(AttributeError):
+        create_emotion_classifier()
+
+
+def test_fer_detector_is_not_fork_safe(stub_fer, monkeypatch):
+    """A TensorFlow-backed detector must not be preloaded and forked"""
+    from emotion_detector import EmotionDetector
+
+    monkeypatch.delenv('EMOTION_CLASSIFIER', raising=False)
+    assert not EmotionDetector(classifier='fer').fork_safe
+
+    monkeypatch.setattr(emotion_classifiers, 'FER_AVAILABLE', False)
+    assert EmotionDetector().fork_safe
@@ -0,0 +1,274 @@
+"""
+Tests for the emotion detector's per-session helpers
+Exercised directly, so no face or emotion models are needed
+"""
+
+import time
+import os
+from datetime import datetime
+
+import cv2
+import numpy as np
+import pytest
+
+from emotion_detector import (
+    EmotionDetector, FaceTracker, FaceTrackerRegistry, FrameCache, QualityGate, VideoTimeline,
+    analyze_video, iter_video_frames, perceptual_hash
+)
+
+
+def textured_frame(offset=(0, 0), size=(240, 320)):
+    """Smooth background with a high-contrast patch (the 'face') at 100,80 + offset"""
+    rng = np.random.default_rng(1)
+    frame = np.full(size, 128, dtype=np.uint8)
+    x, y = 100 + offset[0], 80 + offset[1]
+    frame[y:y+60, x:x+60] = rng.integers(0, 256, (60, 60), dtype=np.uint8)
+    return frame
+
+
+def test_face_tracker_follows_a_moving_face():
+    """Template matching finds the face where it moved, until a redetect is due"""
+    tracker = FaceTracker(redetect_interval=2)
+    first = textured_frame()
+    assert tracker.needs_detection(first)
+
+    tracker.reset(first, [(100, 80, 60, 60)])
+    assert not tracker.needs_detection(first)
+
+    boxes = tracker.track(textured_frame(offset=(6, -4)))
+    assert boxes.tolist() == [[106, 76, 60, 60]]
+    tracker.track(textured_frame(offset=(6, -4)))
+    assert tracker.needs_detection(first)
+
+
+def test_face_tracker_reports_a_lost_face():
+    """A face that left the search window is lost, and a new frame size forces detection"""
+    tracker = FaceTracker()
+    tracker.reset(textured_frame(), [(100, 80, 60, 60)])
+
+    assert tracker.track(np.full((240, 320), 128, dtype=np.uint8)) is None
+    assert tracker.needs_detection(textured_frame(size=(480, 640)))
+
+
+def test_tracker_registry_evicts_least_recently_used():
+    """Trackers are kept per session, up to max_sessions, evicting the least recently used"""
+    registry = FaceTrackerRegistry(max_sessions=2)
+    a = registry.get('a')
+    registry.get('b')
+    assert registry.get('a') is a
+
+    registry.get('c')
+    assert list(registry.trackers) == ['a', 'c']
+
+    registry.discard('a')
+    assert registry.get('a') is not a
+
+
+def test_frame_cache_hits_near_identical_frames():
+    """A frame within max_distance bits reuses the result; a different one misses"""
+    cache = FrameCache(max_distance=2)
+    cache.put('a', 0b1011, {'frame': 1})
+
+    assert cache.get('a', 0b1011) == {'frame': 1}
+    assert cache.get('a', 0b1000) == {'frame': 1}
+    assert cache.get('a', 0b0100) is None
+    assert cache.get('b', 0b1011) is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['hit_rate'] == 0.5
+
+
+def test_frame_cache_is_bounded():
+    """Each session keeps its latest entries, and the least recently used session is evicted"""
+    cache = FrameCache(max_sessions=2, entries_per_session=2, max_distance=0)
+    for frame_hash in (1, 2, 3):
+        cache.put('a', frame_hash, {'frame': frame_hash})
+    assert cache.get('a', 1) is None
+    assert cache.get('a', 3) == {'frame': 3}
+
+    cache.put('b', 1, {'frame': 1})
+    cache.get('a', 3)
+    cache.put('c', 1, {'frame': 1})
+    assert set(cache.sessions) == {'a', 'c'}
+    assert cache.stats()['entries'] == 3
+
+
+def test_frame_cache_entries_expire():
+    """Entries older than the TTL are dropped instead of reused"""
+    cache = FrameCache(ttl=0.05, max_distance=0)
+    cache.put('a', 7, {'frame': 7})
+    assert cache.get('a', 7) == {'frame': 7}
+
+    time.sleep(0.1)
+    assert cache.get('a', 7) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_perceptual_hash_ignores_small_changes():
+    """Slight noise keeps the hash close; a different image does not"""
+    rng = np.random.default_rng(0)
+    frame = np.tile(np.linspace(0, 255, 320, dtype=np.uint8), (240, 1))
+    noisy = np.clip(frame + rng.integers(-3, 4, frame.shape), 0, 255).astype(np.uint8)
+    other = rng.integers(0, 256, frame.shape, dtype=np.uint8)
+
+    def distance(a, b):
+        return bin(perceptual_hash(a) ^ perceptual_hash(b)).count('1')
+
+    assert distance(frame, noisy) <= 8
+    assert distance(frame, other) > 8
+
+
+def test_quality_gate_reasons():
+    """Dark, flat and suddenly changed frames are rejected with their reason"""
+    gate = QualityGate()
+    # 16px black and white squares: sharp, and inverting it changes every pixel
+    checkerboard = (np.indices((240, 320)) // 16).sum(axis=0) % 2 * 255
+    checkerboard = checkerboard.astype(np.uint8)
+
+    assert gate.check(checkerboard, 'a')[0] is None
+    assert gate.check(textured_frame() // 8, 'b')[0] == 'too_dark'
+    assert gate.check(np.full((240, 320), 128, dtype=np.uint8), 'c')[0] == 'blurry'
+    assert gate.check(255 - checkerboard, 'a')[0] == 'motion'
+
+    stats = gate.stats()
+    assert stats['passed'] == 1
+    assert stats['rejected'] == {'too_dark': 1, 'blurry': 1, 'motion': 1}
+
+
+def test_quality_gate_keeps_last_good_result_per_session():
+    """Each session remembers its latest good result, up to max_sessions"""
+    gate = QualityGate(max_sessions=2)
+    gate.remember('a', {'frame': 1})
+    gate.remember('a', {'frame': 2})
+    gate.remember('b', {'frame': 1})
+    assert gate.last_good('a') == {'frame': 2}
+    assert gate.last_good(None) is None
+
+    gate.remember('c', {'frame': 1})
+    assert gate.last_good('a') is None
+    assert gate.last_good('c') == {'frame': 1}
+
+
+def test_rejected_frame_returns_last_good_result():
+    """The detector answers a rejected frame with the session's last good result, flagged"""
+    detector = EmotionDetector(tracking=False, frame_cache=False, quality_gate=True)
+    last_good = {'faces_detected': 1, 'dominant_emotion': 'happy'}
+    detector.quality_gate.remember('a', last_good)
+
+    result, pending = detector.prepare(np.zeros((240, 320, 3), dtype=np.uint8), 'a')
+    assert pending is None
+    assert result['dominant_emotion'] == 'happy'
+    assert result['rejected'] and result['reject_reason'] == 'too_dark'
+
+    result, _ = detector.prepare(np.zeros((240, 320, 3), dtype=np.uint8), 'b')
+    assert result['faces_detected'] == 0 and result['rejected']
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_preloaded_detector_works_in_forked_child():
+    """A fork-safe detector built in the parent warms up and detects in a forked child"""
+    detector = EmotionDetector(tracking=False, frame_cache=False, quality_gate=False)
+    if not detector.fork_safe:
+        pytest.skip(f"{detector.classifier.name} classifier is not fork-safe")
+    frame = cv2.cvtColor(textured_frame(), cv2.COLOR_GRAY2BGR)
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            detector.warm_up(runs=1)
+            result = detector.detect_emotions(frame)
+            status = 0 if 'error' not in result else 1
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def face_result(emotion, score, faces=1, **extra):
+    """Detection result with one emotion scored and the rest at zero"""
+    return dict({'faces_detected': faces, 'emotions': {emotion: score}}, **extra)
+
+
+def test_video_timeline_averages_each_second():
+    """Frames are averaged per second; empty, rejected and failed frames count but do not score"""
+    emitted = []
+    timeline = VideoTimeline(on_second=emitted.append)
+    timeline.add(0.0, face_result('happy', 0.8))
+    timeline.add(0.5, face_result('happy', 0.4, faces=2))
+    timeline.add(1.0, {'faces_detected': 0})
+    timeline.add(1.5, face_result('sad', 0.9, rejected=True))
+    timeline.add(3.2, face_result('sad', 0.6))
+    timeline.add(3.7, {'error': 'boom'})
+    timeline.flush()
+
+    assert emitted == timeline.entries
+    assert [entry['second'] for entry in timeline.entries] == [0, 1, 3]
+    assert [entry['frames'] for entry in timeline.entries] == [2, 2, 2]
+
+    first, empty, last = timeline.entries
+    assert first['dominant_emotion'] == 'happy'
+    assert first['confidence'] == pytest.approx(0.6)
+    assert first['faces_detected'] == 2
+    assert empty['dominant_emotion'] == 'neutral' and empty['faces_detected'] == 0
+    assert last['dominant_emotion'] == 'sad'
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    """Three seconds of 10 fps video whose frame i has brightness 8 * i"""
+    path = str(tmp_path / 'session.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), 8 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_iter_video_frames_samples_at_the_requested_rate(video_path):
+    """Only frames on the sampling grid are returned, with their offsets"""
+    frames = list(iter_video_frames(video_path, sample_fps=2))
+    assert [round(offset, 2) for offset, _ in frames] == [0.0, 0.5, 1.0, 1.5, 2.0, 2.5]
+    assert [int(frame.mean()) for _, frame in frames] == [0, 40, 80, 120, 160, 200]
+
+
+def test_iter_video_frames_rejects_unreadable_files(tmp_path):
+    """A file that cannot be opened raises ValueError"""
+    with pytest.raises(ValueError):
+        list(iter_video_frames(str(tmp_path / 'missing.avi')))
+
+
+def test_analyze_video_logs_one_entry_per_second(video_path):
+    """Sampled frames go through the detector in batches and each second is logged"""
+
+    class StubDetector:
+        def __init__(self):
+            self.batches = []
+
+        def detect_emotions_batch(self, images, session_ids=None):
+            self.batches.append(len(images))
+            return [face_result('happy', image.mean() / 255) for image in images]
+
+    class StubDatabase:
+        def __init__(self):
+            self.logged = []
+
+        def log_emotion(self, session_id, entry, timestamp=None):
+            self.logged.append((session_id, entry['second'], timestamp))
+
+    detector = StubDetector()
+    database = StubDatabase()
+    timeline = analyze_video(detector, video_path, sample_fps=4, batch_size=5,
+                             database=database, session_id='s',
+                             started_at=datetime(2024, 1, 1, 12, 0, 0))
+
+    assert detector.batches == [5, 5, 2]
+    assert [entry['second'] for entry in timeline] == [0, 1, 2]
+    assert [entry['frames'] for entry in timeline] == [4, 4, 4]
+    assert database.logged == [
+        ('s', 0, '2024-01-01T12:00:00'),
+        ('s', 1, '2024-01-01T12:00:01'),
+        ('s', 2, '2024-01-01T12:00:02')
+    ]
@@ -0,0 +1,66 @@
+"""
+Tests for per-session emotion smoothing and capture interval hints
+"""
+
+import json
+
+from emotion_classifiers import EMOTION_LABELS
+from emotion_smoothing import EmotionSmoother
+
+
+def make_result(**emotions):
+    return {'emotions': emotions, 'faces_detected': 1}
+
+
+def test_stable_session_backs_off():
+    """Repeated identical frames lengthen the capture interval up to the max"""
+    smoother = EmotionSmoother(alpha=0.3, min_interval_ms=1000, max_interval_ms=8000, backoff=2.0)
+    intervals = [smoother.update('s1', make_result(happy=0.8, neutral=0.2))['next_capture_ms'] for _ in range(6)]
+
+    assert intervals[0] == 1000
+    assert intervals[1:4] == [2000, 4000, 8000]
+    assert intervals[-1] == 8000
+
+
+def test_change_resets_interval():
+    """A change in dominant emotion resets the interval and is flagged"""
+    smoother = EmotionSmoother(alpha=0.3, min_interval_ms=1000, max_interval_ms=8000, backoff=2.0)
+    for _ in range(4):
+        smoother.update('s1', make_result(happy=0.8, neutral=0.2))
+
+    update = smoother.update('s1', make_result(sad=0.9, neutral=0.1))
+    assert update['emotion_changed']
+    assert update['next_capture_ms'] == 1000
+    assert update['smoothed_dominant_emotion'] == 'happy'
+
+
+def test_rejected_frames_do_not_update_average():
+    """Rejected frames keep the previous average and interval"""
+    smoother = EmotionSmoother(alpha=0.5, min_interval_ms=1000, max_interval_ms=8000, backoff=2.0)
+    first = smoother.update('s1', make_result(happy=1.0))
+    rejected = dict(make_result(sad=1.0), rejected=True)
+    update = smoother.update('s1', rejected)
+
+    assert update['smoothed_emotions'] == first['smoothed_emotions']
+    assert update['next_capture_ms'] == first['next_capture_ms']
+    assert not update['emotion_changed']
+
+
+def test_smoothed_emotions_cover_every_label():
+    """Missing labels score 0 and unknown labels are ignored"""
+    smoother = EmotionSmoother(alpha=0.5)
+    update = smoother.update('s1', make_result(happy=1.0, confused=0.5))
+
+    assert set(update['smoothed_emotions']) == set(EMOTION_LABELS)
+    assert update['smoothed_emotions']['happy'] == 1.0
+    assert update['smoothed_emotions']['sad'] == 0.0
+
+
+def test_updates_serialize_to_json():
+    """Updates go into API responses, so every field must be JSON serializable"""
+    smoother = EmotionSmoother()
+    for result in (make_result(happy=0.8, neutral=0.2), make_result(happy=0.8, neutral=0.2),
+                   make_result(sad=0.9, neutral=0.1), dict(make_result(), rejected=True)):
+        update = smoother.update('s1', result)
+        assert json.loads(json.dumps(update)) == update
+        assert type(update['emotion_changed']) is bool
@@ -0,0 +1,70 @@
+"""
+Tests for the face detector backends
+Uses the Haar cascade bundled with OpenCV; the DNN backends need downloaded models
+"""
+
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from emotion_detector import EmotionDetector
+from face_detectors import HaarFaceDetector, create_face_detector
+from stage_pipeline import StagePipeline
+
+THREADS = 8
+
+
+def noise_frames(count, size=(120, 160)):
+    """Random grayscale frames; enough structure to keep the cascade busy"""
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, size, dtype=np.uint8) for _ in range(count)]
+
+
+def run_threads(target, count=THREADS):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_face_detector('nonexistent')
+
+
+def test_haar_detector_gives_each_thread_its_own_cascade():
+    """Concurrent detections never share a CascadeClassifier and match a single-threaded run"""
+    detector = HaarFaceDetector()
+    frames = noise_frames(THREADS)
+    expected = [detector.detect(frame).tolist() for frame in frames]
+    cascades = {}
+    results = {}
+
+    def detect(i):
+        cascades[i] = detector.cascade
+        results[i] = [detector.detect(frames[i]).tolist() for _ in range(5)]
+
+    run_threads(detect)
+
+    assert len({id(cascade) for cascade in cascades.values()}) == THREADS
+    assert all(results[i] == [expected[i]] * 5 for i in range(THREADS))
+
+
+def test_stage_pipeline_detects_concurrently_with_haar():
+    """Frames from concurrent callers through several detect workers all succeed"""
+    detector = EmotionDetector(tracking=False, frame_cache=False, quality_gate=False, face_detector='haar')
+    pipeline = StagePipeline(detector, decode_workers=2, detect_workers=4, classify_workers=1)
+    jpegs = [cv2.imencode('.jpg', frame)[1].tobytes() for frame in noise_frames(THREADS)]
+    results = {}
+
+    def call(i):
+        results[i] = [pipeline.detect_encoded(jpegs[i]) for _ in range(5)]
+
+    run_threads(call)
+
+    results = [result for batch in results.values() for result in batch]
+    assert len(results) == 5 * THREADS
+    assert not [result for result in results if 'error' in result]
@@ -0,0 +1,42 @@
+"""
+Tests for the multi-category keyword matcher
+"""
+
+from keyword_matcher import KeywordMatcher
+
+
+MATCHER = KeywordMatcher({
+    'sadness': ['sad', 'down'],
+    'fear': ['worried', 'afraid'],
+    'stress': ['worried', 'pressure'],
+    'crisis': ['self harm', 'kill myself'],
+    'greeting': ['hi']
+})
+
+
+def test_whole_words_only():
+    """Keywords inside longer words do not match"""
+    assert MATCHER.find('I think this download is sadly slow') == set()
+    assert MATCHER.find('Hi, I feel SAD and down.') == {'hi', 'sad', 'down'}
+
+
+def test_phrases_match_across_separators():
+    """Phrase words match across spaces, hyphens and punctuation, but only adjacent"""
+    assert MATCHER.find('thoughts of self-harm') == {'self harm'}
+    assert MATCHER.find('I want to kill   myself') == {'kill myself'}
+    assert MATCHER.find('myself, I would never kill') == set()
+
+
+def test_counts_cover_every_category():
+    """A keyword in several categories counts once in each"""
+    counts = MATCHER.scan("I'm worried")
+    assert counts == {'sadness': 0, 'fear': 1, 'stress': 1, 'crisis': 0, 'greeting': 0}
+
+
+def test_prefix_categories_match_inflections():
+    """Keywords of prefix categories match at word starts only; other categories stay whole-word"""
+    matcher = KeywordMatcher({'crisis': ['overdose', 'self harm'], 'sadness': ['sad']},
+                             prefix_categories=('crisis',))
+    assert matcher.find('I overdosed and keep self-harming') == {'overdose', 'self harm'}
+    assert matcher.find('an unselfish harmless remark') == set()
+    assert matcher.find('sadly') == set()
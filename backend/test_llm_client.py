@@ -0,0 +1,72 @@
+"""
+Tests for the async LLM client against the mock OpenAI-compatible server
+"""
+
+import random
+import time
+
+import pytest
+
+from chatbot import TherapeuticChatbot
+from llm_client import LLMClient
+from mock_llm_server import MockLLMServer, parse_distribution
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**options):
+        server = MockLLMServer(seed=0, **options)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+MESSAGES = [{'role': 'user', 'content': 'Hi'}]
+
+
+def test_complete_and_stream(start_server):
+    """Completions come back whole or piece by piece over the pooled client"""
+    server = start_server(response_tokens=5)
+    client = LLMClient('test-key', base_url=server.base_url, deadline=2)
+    assert client.complete(MESSAGES, model='gpt-3.5-turbo') == 'It sounds like you have'
+    assert list(client.stream(MESSAGES, model='gpt-3.5-turbo')) == ['It', ' sounds', ' like', ' you', ' have']
+    assert client.stats()['completed'] == 2
+    assert server.stats()['requests'] == 2 and server.stats()['streamed'] == 1
+
+
+def test_deadline_falls_back_to_rule_based(start_server):
+    """A slow upstream is abandoned at the deadline and the rule-based response is used"""
+    server = start_server(latency='fixed:2000')
+    chatbot = TherapeuticChatbot(base_url=server.base_url)
+    chatbot.llm_client.deadline = 0.3
+
+    started = time.monotonic()
+    response = chatbot.generate_response("I'm so stressed about work")
+    assert time.monotonic() - started < 1.5
+    assert response and not response.startswith('It sounds like you have')
+    assert chatbot.get_stats()['llm']['timeouts'] == 1
+
+
+def test_errors_fall_back_to_rule_based(start_server):
+    """Upstream errors are not retried and streaming falls back before the first piece"""
+    server = start_server(error_rate=1.0, error_status=503)
+    chatbot = TherapeuticChatbot(base_url=server.base_url)
+    assert len(list(chatbot.stream_response('I feel sad'))) == 1
+    assert chatbot.get_stats()['llm']['errors'] == 1
+    assert server.stats()['errors'] == 1
+
+
+def test_latency_distributions():
+    """Distribution specs parse into non-negative samplers"""
+    rng = random.Random(0)
+    assert parse_distribution('fixed:250')(rng) == 250
+    assert all(100 <= parse_distribution('uniform:100:200')(rng) <= 200 for _ in range(100))
+    assert all(parse_distribution('normal:10:50')(rng) >= 0 for _ in range(100))
+    with pytest.raises(ValueError):
+        parse_distribution('gamma:1:2')
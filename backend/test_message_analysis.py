@@ -0,0 +1,67 @@
+"""
+Tests for the per-message analysis shared by the chatbot's decisions
+"""
+
+from chatbot import MessageAnalysis, TherapeuticChatbot
+
+
+def test_crisis_flag_and_response_agree():
+    """A message flagged as a crisis also gets the crisis response"""
+    chatbot = TherapeuticChatbot()
+    chatbot.llm_client = None
+    for message in ['I just want to give up', 'There is no point anymore', 'thoughts of self-harm']:
+        analysis = chatbot.analyze(message)
+        assert analysis.crisis and analysis.sentiment == 'crisis'
+        assert chatbot.detect_crisis(analysis)
+        assert '988' in chatbot.generate_response(analysis)
+
+
+def test_analysis_is_computed_once():
+    """Passing an analysis on reuses it instead of re-scanning the text"""
+    chatbot = TherapeuticChatbot()
+    analysis = MessageAnalysis("I'm so stressed and worried about work")
+    assert chatbot.analyze(analysis) is analysis
+    assert analysis.sentiment == 'stress'
+    assert analysis.has('stressed') and not analysis.crisis
+    assert analysis.word_count == 7
+
+
+# The substring check the chatbot used before keywords matched whole words
+BASELINE_CRISIS_INDICATORS = [
+    'suicide', 'kill myself', 'end it all', 'not worth living',
+    'want to die', 'hurt myself', 'self harm', 'cutting',
+    'overdose', 'no point', 'give up', 'end my life'
+]
+
+CRISIS_MESSAGES = [
+    'I overdosed last night',
+    'I keep self harming',
+    'I self harmed again yesterday',
+    'I have been cutting again',
+    'Sometimes I want to kill myself',
+    'I just want to give up on everything',
+    'There is no point anymore',
+    'I thought about suicide',
+    'I want to end my life',
+]
+
+
+def test_crisis_recall_matches_baseline():
+    """Every message the substring check flagged is still a crisis, with the crisis response"""
+    chatbot = TherapeuticChatbot()
+    chatbot.llm_client = None
+    for message in CRISIS_MESSAGES:
+        assert any(indicator in message.lower() for indicator in BASELINE_CRISIS_INDICATORS), message
+        analysis = chatbot.analyze(message)
+        assert chatbot.detect_crisis(message), message
+        assert analysis.sentiment == 'crisis', message
+        assert '988' in chatbot.generate_response(analysis), message
+
+
+def test_crisis_inflections_beyond_baseline():
+    """Inflected forms the substring check missed are caught too"""
+    chatbot = TherapeuticChatbot()
+    for message in ['I feel suicidal', 'I have been hurting myself', 'I am overdosing', 'I am giving up',
+                    'I wanted to die last week']:
+        assert chatbot.detect_crisis(message), message
+    assert not chatbot.detect_crisis('I downloaded a new game and feel fine')
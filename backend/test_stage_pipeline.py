@@ -0,0 +1,85 @@
+"""
+Tests for the stage-pipelined detection path
+Uses a stub detector so no models are needed
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from stage_pipeline import StagePipeline
+
+
+class StubDetector:
+    """One fake face per frame; the frame's value is its face's score"""
+
+    def __init__(self):
+        self.batches = []
+
+    def prepare(self, image, session_id=None):
+        if image is None or image.size == 0:
+            return {'faces_detected': 0}, None
+        return None, ([(0, 0, 1, 1)], [image], session_id, None)
+
+    def classify_faces(self, face_crops):
+        self.batches.append(len(face_crops))
+        return np.array([[float(crop.flat[0])] for crop in face_crops])
+
+    def finish(self, pending, predictions):
+        return {'faces_detected': len(pending[0]), 'score': float(predictions[0][0]), 'session_id': pending[2]}
+
+    def _error_result(self, error):
+        return {'error': str(error)}
+
+    def get_stats(self):
+        return {}
+
+
+class FullFrameDetector(StubDetector):
+    """Reports one face covering the whole decoded frame"""
+
+    def finish(self, pending, predictions):
+        height, width = pending[1][0].shape[:2]
+        return {'faces_detected': 1, 'face_locations': [{'x': 0, 'y': 0, 'width': width, 'height': height}]}
+
+
+def test_concurrent_frames_get_their_own_results():
+    """Frames from concurrent callers come back matched to their caller"""
+    detector = StubDetector()
+    pipeline = StagePipeline(detector, decode_workers=1, detect_workers=2, classify_workers=1, queue_size=4)
+    results = {}
+
+    def call(i):
+        results[i] = pipeline.detect_emotions(np.full((2, 2), i, dtype=np.uint8), session_id=f"session-{i}")
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[i] == {'faces_detected': 1, 'score': float(i), 'session_id': f"session-{i}"} for i in range(16))
+    assert sum(detector.batches) == 16
+
+    stages = pipeline.get_stats()['stages']
+    assert stages['detect']['processed'] == 16
+    assert stages['classify']['processed'] == 16
+    assert stages['detect']['queue_depth'] == 0
+
+
+def test_undecodable_frame_returns_none():
+    """An invalid encoded frame finishes at the decode stage"""
+    pipeline = StagePipeline(StubDetector(), decode_workers=1, detect_workers=1, classify_workers=1)
+    assert pipeline.detect_encoded(b'not an image') is None
+    assert pipeline.get_stats()['stages']['detect']['processed'] == 0
+
+
+def test_reduced_decode_reports_full_size_locations(monkeypatch):
+    """With DECODE_REDUCTION the face is found in a smaller frame but located in the uploaded one"""
+    monkeypatch.setenv('DECODE_REDUCTION', '2')
+    pipeline = StagePipeline(FullFrameDetector(), decode_workers=1, detect_workers=1, classify_workers=1)
+    _, jpeg = cv2.imencode('.jpg', np.zeros((96, 128, 3), dtype=np.uint8))
+
+    result = pipeline.detect_encoded(jpeg.tobytes())
+    assert result['face_locations'] == [{'x': 0, 'y': 0, 'width': 128, 'height': 96}]
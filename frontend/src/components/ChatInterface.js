@@ -56,26 +56,75 @@ function ChatInterface({ sessionId, currentEmotion }) {
     setMessages(prev => [...prev, newUserMessage]);
 
     try {
-      const response = await axios.post(`${API_BASE_URL}/chat/message`, {
-        message: userMessage,
-        session_id: sessionId,
-        current_emotion: currentEmotion?.dominant_emotion
+      // The response is streamed as server-sent events so its first words
+      // show up while the rest is still being generated
+      const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          message: userMessage,
+          session_id: sessionId,
+          current_emotion: currentEmotion?.dominant_emotion
+        })
       });
+      if (!response.ok || !response.body) {
+        throw new Error('Failed to get response');
+      }
 
-      if (response.data.success) {
-        const botMessage = {
-          role: 'assistant',
-          content: response.data.response,
-          timestamp: response.data.timestamp,
-          crisis: response.data.crisis_detected || false
-        };
-        setMessages(prev => [...prev, botMessage]);
-        
-        // Show crisis alert if detected
-        if (response.data.crisis_detected) {
-          alert('⚠️ Crisis Detected: If you are in immediate danger, please call 911 or go to your nearest emergency room. You can also call the National Suicide Prevention Lifeline at 988 (available 24/7).');
+      let botMessage = null;
+      const updateBotMessage = (changes) => {
+        const previous = botMessage;
+        const message = { ...botMessage, ...changes };
+        botMessage = message;
+        setMessages(prev => prev.map(m => (m === previous ? message : m)));
+      };
+
+      const handleEvent = (event, data) => {
+        if (event === 'start') {
+          botMessage = {
+            role: 'assistant',
+            content: '',
+            timestamp: new Date().toISOString(),
+            crisis: data.crisis_detected || false
+          };
+          setMessages(prev => [...prev, botMessage]);
+          setIsLoading(false);
+
+          // Show crisis alert if detected
+          if (data.crisis_detected) {
+            alert('⚠️ Crisis Detected: If you are in immediate danger, please call 911 or go to your nearest emergency room. You can also call the National Suicide Prevention Lifeline at 988 (available 24/7).');
+          }
+        } else if (event === 'token') {
+          updateBotMessage({ content: botMessage.content + data.text });
+        } else if (event === 'done') {
+          updateBotMessage({ content: data.response, timestamp: data.timestamp });
+        } else if (event === 'error') {
+          throw new Error(data.error);
         }
-      } else {
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const block = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          const event = block.match(/^event: (.*)$/m);
+          const data = block.match(/^data: (.*)$/m);
+          if (event && data) {
+            handleEvent(event[1], JSON.parse(data[1]));
+          }
+        }
+      }
+
+      if (!botMessage) {
         throw new Error('Failed to get response');
       }
     } catch (error) {
@@ -3,6 +3,10 @@ import './WebcamCapture.css';
 import axios from 'axios';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api';
+const DEFAULT_CAPTURE_MS = 2000;
+
+// Increases with every captured frame so the server can drop superseded ones
+let frameSequence = 0;
 
 function WebcamCapture({ sessionId, onEmotionDetected }) {
   const videoRef = useRef(null);
@@ -11,7 +15,7 @@ function WebcamCapture({ sessionId, onEmotionDetected }) {
   const [currentEmotion, setCurrentEmotion] = useState(null);
   const [error, setError] = useState(null);
   const streamRef = useRef(null);
-  const intervalRef = useRef(null);
+  const timeoutRef = useRef(null);
 
   useEffect(() => {
     return () => {
@@ -32,8 +36,8 @@ function WebcamCapture({ sessionId, onEmotionDetected }) {
         streamRef.current = stream;
         setIsStreaming(true);
 
-        // Start capturing frames every 2 seconds
-        intervalRef.current = setInterval(captureAndDetect, 2000);
+        // Start capturing frames; the server suggests the delay to the next one
+        scheduleCapture(DEFAULT_CAPTURE_MS);
       }
     } catch (err) {
       setError('Unable to access camera. Please check permissions.');
@@ -41,10 +45,19 @@ function WebcamCapture({ sessionId, onEmotionDetected }) {
     }
   };
 
+  const scheduleCapture = (delay) => {
+    timeoutRef.current = setTimeout(async () => {
+      const nextDelay = await captureAndDetect();
+      if (streamRef.current) {
+        scheduleCapture(nextDelay);
+      }
+    }, delay);
+  };
+
   const stopStreaming = () => {
-    if (intervalRef.current) {
-      clearInterval(intervalRef.current);
-      intervalRef.current = null;
+    if (timeoutRef.current) {
+      clearTimeout(timeoutRef.current);
+      timeoutRef.current = null;
     }
 
     if (streamRef.current) {
@@ -60,7 +73,7 @@ function WebcamCapture({ sessionId, onEmotionDetected }) {
   };
 
   const captureAndDetect = async () => {
-    if (!videoRef.current || !canvasRef.current) return;
+    if (!videoRef.current || !canvasRef.current) return DEFAULT_CAPTURE_MS;
 
     const video = videoRef.current;
     const canvas = canvasRef.current;
@@ -72,25 +85,37 @@ function WebcamCapture({ sessionId, onEmotionDetected }) {
 
     // Draw current video frame to canvas
     context.drawImage(video, 0, 0, canvas.width, canvas.height);
+    const capturedAt = Date.now();
+    const sequence = ++frameSequence;
 
-    // Convert canvas to base64
-    const imageData = canvas.toDataURL('image/jpeg', 0.8);
+    // Encode frame as a JPEG blob (sent as raw bytes, no base64)
+    const imageBlob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.8));
+    if (!imageBlob) return DEFAULT_CAPTURE_MS;
 
     try {
       // Send to backend for emotion detection
-      const response = await axios.post(`${API_BASE_URL}/emotion/detect`, {
-        image: imageData,
-        session_id: sessionId
+      const response = await axios.post(`${API_BASE_URL}/emotion/detect_binary`, imageBlob, {
+        headers: { 'Content-Type': 'image/jpeg' },
+        params: { session_id: sessionId, sequence, captured_at: capturedAt }
       });
 
       if (response.data.success) {
-        const emotionData = response.data.emotions;
-        setCurrentEmotion(emotionData);
-        onEmotionDetected(emotionData);
+        // Stale results (server overloaded) repeat the last detection
+        if (!response.data.stale) {
+          const emotionData = response.data.emotions;
+          setCurrentEmotion(emotionData);
+          onEmotionDetected(emotionData);
+        }
+        return response.data.next_capture_ms || DEFAULT_CAPTURE_MS;
       }
     } catch (err) {
+      // Overloaded with no earlier result: wait as long as the server asks
+      if (err.response && err.response.data && err.response.data.retry_after_ms) {
+        return err.response.data.retry_after_ms;
+      }
       console.error('Emotion detection error:', err);
     }
+    return DEFAULT_CAPTURE_MS;
   };
 
   const getEmotionColor = (emotion) => {